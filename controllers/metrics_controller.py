@@ -0,0 +1,19 @@
+from flask import jsonify
+from utils.cache import cache_stats
+from utils.mysql_pool import MySQLPool
+from utils.zodb import ZODBConnection
+
+class MetricsController:
+    @staticmethod
+    def get_metrics():
+        try:
+            return jsonify({
+                "message": "Metrics retrieved successfully",
+                "data": {
+                    "mysql_pools": MySQLPool.stats(),
+                    "zodb": ZODBConnection.stats(),
+                    "caches": cache_stats()
+                }
+            }), 200
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
@@ -1,15 +1,110 @@
-from flask import jsonify
+import itertools
+import time
+from concurrent.futures import ThreadPoolExecutor
+from flask import Response, json, jsonify, request, stream_with_context
+from config import Config
 from models.product import Product
 from models.mongodb_models import ProductComment, ProductImage
+from utils.http import cache_headers, make_etag, not_modified
+
+# Shared by the composite endpoints to query the backends concurrently
+_executor = ThreadPoolExecutor(max_workers=Config.FANOUT_WORKERS)
+
+def _timed(func, *args, **kwargs):
+    started = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, (time.perf_counter() - started) * 1000
 
 class ProductController:
+    @staticmethod
+    def _parse_list_args(args):
+        def optional(name, convert):
+            value = args.get(name)
+            if value is None or value == '':
+                return None
+            try:
+                return convert(value)
+            except ValueError:
+                raise ValueError(f"Invalid value for '{name}': {value}")
+
+        limit = optional('limit', int)
+        if limit is None:
+            limit = Config.PRODUCTS_PAGE_SIZE
+        if limit < 1 or limit > Config.PRODUCTS_MAX_PAGE_SIZE:
+            raise ValueError(f"'limit' must be between 1 and {Config.PRODUCTS_MAX_PAGE_SIZE}")
+
+        fields = args.get('fields')
+        return {
+            'after': optional('after', int),
+            'limit': limit,
+            'fields': [f.strip() for f in fields.split(',') if f.strip()] if fields else None,
+            'id_categoria': optional('id_categoria', int),
+            'marca': args.get('marca') or None,
+            'preco_min': optional('preco_min', float),
+            'preco_max': optional('preco_max', float)
+        }
+
+    @staticmethod
+    def _stream(rows, fmt='ndjson'):
+        """Stream rows as NDJSON (one document per line) or as a chunked JSON array."""
+        def ndjson():
+            for row in rows:
+                yield json.dumps(row) + '\n'
+
+        def json_array():
+            yield '['
+            first = True
+            for row in rows:
+                yield ('' if first else ',') + json.dumps(row)
+                first = False
+            yield ']'
+
+        if fmt == 'json':
+            return Response(stream_with_context(json_array()), mimetype='application/json')
+        return Response(stream_with_context(ndjson()), mimetype='application/x-ndjson')
+
+    @staticmethod
+    def _stream_format(args):
+        fmt = args.get('format', 'ndjson')
+        if fmt not in ('ndjson', 'json'):
+            raise ValueError("'format' must be 'ndjson' or 'json'")
+        return fmt
+
+    @staticmethod
+    def export_products():
+        try:
+            fmt = ProductController._stream_format(request.args)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        products = Product.iter_all(batch_size=Config.EXPORT_BATCH_SIZE)
+        return ProductController._stream(products, fmt)
+
     @staticmethod
     def get_all_products():
         try:
-            products = Product.get_all()
+            params = ProductController._parse_list_args(request.args)
+
+            # The catalog version changes with any product write, so the page
+            # can be answered with a 304 before it is queried
+            counter, last_modified = Product.get_catalog_version()
+            etag = make_etag('catalog', counter, last_modified, sorted(request.args.items(multi=True)))
+            response = not_modified(etag, last_modified)
+            if response:
+                return response
+            headers = cache_headers(etag, last_modified)
+
+            # Same version as the ETag, so the body always matches it
+            products, next_cursor = Product.get_page(version=(counter, last_modified), **params)
+            pagination = {"limit": params['limit'], "next_cursor": next_cursor}
             if not products:
-                return jsonify({"message": "No products found", "data": []}), 200
-            return jsonify({"message": "Products retrieved successfully", "data": products}), 200
+                return jsonify({"message": "No products found", "data": [], "pagination": pagination}), 200, headers
+            return jsonify({
+                "message": "Products retrieved successfully",
+                "data": products,
+                "pagination": pagination
+            }), 200, headers
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
         except Exception as e:
             return jsonify({"error": str(e)}), 500
 
@@ -17,22 +112,127 @@ class ProductController:
     def get_product_by_code(code):
         try:
             product = Product.get_by_code(code)
-            if product:
-                return jsonify({"message": "Product found", "data": product}), 200
-            return jsonify({"error": "Product not found"}), 404
+            if not product:
+                return jsonify({"error": "Product not found"}), 404
+
+            last_modified = Product.get_version(product)
+            etag = make_etag(code, last_modified)
+            response = not_modified(etag, last_modified)
+            if response:
+                return response
+            return jsonify({"message": "Product found", "data": product}), 200, cache_headers(etag, last_modified)
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+
+    @staticmethod
+    def get_products_batch():
+        try:
+            body = request.get_json(silent=True) or {}
+            codes = body.get('codes')
+            if not isinstance(codes, list) or not all(isinstance(code, str) for code in codes):
+                return jsonify({"error": "'codes' must be a list of product codes"}), 400
+            codes = list(dict.fromkeys(codes))  # Drop duplicates, keep order
+            if len(codes) > Config.BATCH_MAX_CODES:
+                return jsonify({"error": f"At most {Config.BATCH_MAX_CODES} codes per request"}), 400
+
+            # Products, comments and images are independent lookups; run them together
+            products = _executor.submit(Product.get_many, codes)
+            comments = _executor.submit(ProductComment.get_comments_by_product_codes, codes)
+            images = _executor.submit(ProductImage.get_images_by_product_codes, codes)
+            products, comments, images = products.result(), comments.result(), images.result()
+
+            data = {}
+            for code in codes:
+                if not products.get(code):
+                    data[code] = {"error": "Product not found"}
+                    continue
+                data[code] = {
+                    "product": products[code],
+                    "comments": comments.get(code, []),
+                    "images": images.get(code)
+                }
+
+            return jsonify({
+                "message": "Products retrieved successfully",
+                "data": data,
+                "not_found": [code for code in codes if not products.get(code)]
+            }), 200
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+
+    @staticmethod
+    def get_product_full(code):
+        try:
+            limit = request.args.get('comments_limit')
+            try:
+                limit = int(limit) if limit not in (None, '') else None
+            except ValueError:
+                return jsonify({"error": f"Invalid value for 'comments_limit': {limit}"}), 400
+            if limit is not None and (limit < 0 or limit > Config.COMMENTS_MAX_LIMIT):
+                return jsonify({"error": f"'comments_limit' must be between 0 and {Config.COMMENTS_MAX_LIMIT}"}), 400
+            sort = request.args.get('comments_sort')
+            if sort and sort not in ProductComment.SORT_FIELDS:
+                return jsonify({"error": f"'comments_sort' must be one of {sorted(ProductComment.SORT_FIELDS)}"}), 400
+
+            started = time.perf_counter()
+            futures = {
+                'product': _executor.submit(_timed, Product.get_by_code, code),
+                'comments': _executor.submit(_timed, ProductComment.get_comments_by_product_code,
+                                             code, limit=limit, sort=sort),
+                'rating': _executor.submit(_timed, ProductComment.get_rating_summary, code),
+                'images': _executor.submit(_timed, ProductImage.get_images_by_product_code, code)
+            }
+            results = {}
+            timings = []
+            for name, future in futures.items():
+                results[name], duration = future.result()
+                timings.append(f"{name};dur={duration:.1f}")
+            timings.append(f"total;dur={(time.perf_counter() - started) * 1000:.1f}")
+            headers = {'Server-Timing': ', '.join(timings)}
+
+            if not results['product']:
+                return jsonify({"error": "Product not found"}), 404, headers
+
+            return jsonify({
+                "message": "Product found",
+                "data": {
+                    "product": results['product'],
+                    "comments": results['comments'],
+                    "total_comments": results['rating']['total_comments'],
+                    "average_rating": results['rating']['average_rating'],
+                    "images": results['images']
+                }
+            }), 200, headers
         except Exception as e:
             return jsonify({"error": str(e)}), 500
 
     @staticmethod
     def get_product_comments(code):
         try:
-            # First check if product exists
-            product = Product.get_by_code(code)
-            if not product:
+            # Query MongoDB first; only a miss needs the product existence check
+            if request.args.get('stream') in ('1', 'true'):
+                try:
+                    fmt = ProductController._stream_format(request.args)
+                except ValueError as e:
+                    return jsonify({"error": str(e)}), 400
+                cursor = ProductComment.iter_comments_by_product_code(
+                    code, batch_size=Config.EXPORT_BATCH_SIZE)
+                first = next(cursor, None)
+                if first is None:
+                    if not Product.exists(code):
+                        return jsonify({"error": "Product not found"}), 404
+                    comments = iter(())
+                else:
+                    comments = itertools.chain([first], cursor)
+                return ProductController._stream(comments, fmt)
+
+            comments, etag = ProductComment.get_comments_with_etag(code)
+            if not comments and not Product.exists(code):
                 return jsonify({"error": "Product not found"}), 404
 
-            # Get comments from MongoDB
-            comments = ProductComment.get_comments_by_product_code(code)
+            response = not_modified(etag)
+            if response:
+                return response
             return jsonify({
                 "message": "Comments retrieved successfully",
                 "data": {
@@ -40,26 +240,26 @@ class ProductController:
                     "total_comments": len(comments),
                     "comments": comments
                 }
-            }), 200
+            }), 200, cache_headers(etag)
         except Exception as e:
             return jsonify({"error": str(e)}), 500
 
     @staticmethod
     def get_product_images(code):
         try:
-            # First check if product exists
-            product = Product.get_by_code(code)
-            if not product:
-                return jsonify({"error": "Product not found"}), 404
-
-            # Get images from MongoDB
-            images = ProductImage.get_images_by_product_code(code)
+            # Query MongoDB first; only a miss needs the product existence check
+            images, etag = ProductImage.get_images_with_etag(code)
             if not images:
+                if not Product.exists(code):
+                    return jsonify({"error": "Product not found"}), 404
                 return jsonify({"error": "No images found for this product"}), 404
 
+            response = not_modified(etag)
+            if response:
+                return response
             return jsonify({
                 "message": "Images retrieved successfully",
                 "data": images
-            }), 200
+            }), 200, cache_headers(etag)
         except Exception as e:
-            return jsonify({"error": str(e)}), 500 
\ No newline at end of file
+            return jsonify({"error": str(e)}), 500
\ No newline at end of file
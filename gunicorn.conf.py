@@ -0,0 +1,22 @@
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', 3333)}"
+# Every worker opens its VarejoBase pool (MYSQL_POOL_SIZE connections) up front, so the
+# default worker count is capped to keep workers x pool size within MYSQL_CONNECTION_BUDGET
+_pool_size = int(os.getenv('MYSQL_POOL_SIZE_VAREJOBASE', os.getenv('MYSQL_POOL_SIZE', 5)))
+_connection_budget = int(os.getenv('MYSQL_CONNECTION_BUDGET', 100))
+workers = int(os.getenv('GUNICORN_WORKERS', max(1, min(multiprocessing.cpu_count() * 2 + 1,
+                                                        _connection_budget // _pool_size))))
+# Threaded workers, so a slow Mongo/MySQL query only holds one thread
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', 4))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
+accesslog = '-'
+
+def post_worker_init(worker):
+    # Database handles are opened per worker, after the fork
+    from main import init_resources
+    init_resources()
@@ -1,25 +1,57 @@
+import atexit
 from flask import Flask
 from routes import api
 from flask_cors import CORS
+from config import Config
+from models.mongodb_models import MongoDBConnection
+from utils.mysql_pool import MySQLPool
+from utils.zodb import ZODBConnection
 
-app = Flask(__name__)
-CORS(app, resources={
-    r"/api/*": {
-        "origins": "*",  # In production, replace with specific domain
-        "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-        "allow_headers": ["Content-Type", "Authorization"]
-    }
-})
-
-# Register blueprints
-app.register_blueprint(api, url_prefix='/api')
-
-@app.route('/')
-def index():
-    return {
-        'status': 'ok',
-        'message': 'API is running'
-    }
+def create_app(config_class=Config):
+    app = Flask(__name__)
+    app.config.from_object(config_class)
+    CORS(app, resources={
+        r"/api/*": {
+            "origins": "*",  # In production, replace with specific domain
+            "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
+            "allow_headers": ["Content-Type", "Authorization"]
+        }
+    })
+
+    # Register blueprints
+    app.register_blueprint(api, url_prefix='/api')
+
+    @app.route('/')
+    def index():
+        return {
+            'status': 'ok',
+            'message': 'API is running'
+        }
+
+    return app
+
+def init_resources():
+    """Open this process's database handles and close them on shutdown.
+
+    Must run in each worker after the fork (see gunicorn.conf.py), never in
+    the master: sockets and the ZODB DB can't be shared across processes.
+    """
+    ZODBConnection.open()
+    MongoDBConnection.get_instance()
+    for database in ('VarejoBase',):
+        try:
+            MySQLPool.get_pool(database)
+        except Exception as e:
+            # The pool is created again on the first request
+            print(f"Could not open MySQL pool for {database}: {str(e)}")
+    atexit.register(close_resources)
+
+def close_resources():
+    ZODBConnection.close()
+    MySQLPool.close_all()
+    MongoDBConnection.close()
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=3333, debug=True) 
\ No newline at end of file
+    app = create_app()
+    init_resources()
+    app.run(host='0.0.0.0', port=3333, debug=True)
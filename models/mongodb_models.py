@@ -1,5 +1,9 @@
+import pymongo
 from pymongo import MongoClient
 import os
+from config import Config
+from utils.cache import comment_cache, image_cache
+from utils.http import content_etag
 
 class MongoDBConnection:
     _instance = None
@@ -13,19 +17,187 @@ class MongoDBConnection:
             )
         return cls._instance
 
+    @classmethod
+    def close(cls):
+        if cls._instance is not None:
+            cls._instance.close()
+            cls._instance = None
+
 class ProductComment:
+    # Accepted values for the sort argument ("-" means descending)
+    SORT_FIELDS = {'date', '-date', 'rating', '-rating'}
+
     @staticmethod
-    def get_comments_by_product_code(product_code):
+    def get_comments_by_product_code(product_code, limit=None, sort=None):
+        return ProductComment.get_comments_with_etag(product_code, limit, sort)[0]
+
+    @staticmethod
+    def get_comments_with_etag(product_code, limit=None, sort=None):
+        """Return (comments, etag); the ETag is computed once, when the cache is filled."""
+        cache_key = f"{product_code}|{limit}|{sort}"
+        found, entry = comment_cache.get(cache_key)
+        if found:
+            return entry
+
+        comments = ProductComment._fetch_comments(product_code, limit, sort)
+        entry = (comments, content_etag(comments))
+        comment_cache.set(cache_key, entry, ttl=None if comments else Config.CACHE_NEGATIVE_TTL)
+        return entry
+
+    @staticmethod
+    def _fetch_comments(product_code, limit=None, sort=None):
         client = MongoDBConnection.get_instance()
         db = client.varejo
-        return list(db.product_comments.find(
+        cursor = db.product_comments.find(
             {"product_code": product_code},
             {"_id": 0}  # Exclude MongoDB _id from results
-        ))
+        )
+        if sort:
+            if sort not in ProductComment.SORT_FIELDS:
+                raise ValueError(f"Invalid sort: {sort}")
+            direction = pymongo.DESCENDING if sort.startswith('-') else pymongo.ASCENDING
+            cursor = cursor.sort(sort.lstrip('-'), direction)
+        if limit == 0:
+            # Only the totals were asked for (Mongo's limit(0) would mean "no limit")
+            return []
+        if limit:
+            cursor = cursor.limit(limit)
+        return list(cursor)
+
+    @staticmethod
+    def get_comments_by_product_codes(product_codes):
+        """Comments for several products with a single $in query; returns {code: [comments]}."""
+        result = {}
+        missing = []
+        for code in product_codes:
+            found, entry = comment_cache.get(f"{code}|None|None")
+            if found:
+                result[code] = entry[0]
+            else:
+                missing.append(code)
+        if not missing:
+            return result
+
+        client = MongoDBConnection.get_instance()
+        db = client.varejo
+        fetched = {code: [] for code in missing}
+        for comment in db.product_comments.find(
+            {"product_code": {"$in": missing}},
+            {"_id": 0}
+        ):
+            fetched[comment['product_code']].append(comment)
+
+        for code, comments in fetched.items():
+            comment_cache.set(f"{code}|None|None", (comments, content_etag(comments)),
+                              ttl=None if comments else Config.CACHE_NEGATIVE_TTL)
+        result.update(fetched)
+        return result
+
+    @staticmethod
+    def get_rating_summary(product_code):
+        cache_key = f"{product_code}|rating"
+        found, summary = comment_cache.get(cache_key)
+        if found:
+            return summary
+
+        summary = ProductComment._fetch_rating_summary(product_code)
+        comment_cache.set(cache_key, summary)
+        return summary
+
+    @staticmethod
+    def _fetch_rating_summary(product_code):
+        client = MongoDBConnection.get_instance()
+        db = client.varejo
+        result = list(db.product_comments.aggregate([
+            {"$match": {"product_code": product_code}},
+            {"$group": {
+                "_id": None,
+                "total_comments": {"$sum": 1},
+                "average_rating": {"$avg": "$rating"}
+            }}
+        ]))
+        if not result:
+            return {"total_comments": 0, "average_rating": None}
+        return {
+            "total_comments": result[0]["total_comments"],
+            "average_rating": result[0]["average_rating"]
+        }
+
+    @staticmethod
+    def iter_comments_by_product_code(product_code, batch_size=1000):
+        client = MongoDBConnection.get_instance()
+        db = client.varejo
+        return db.product_comments.find(
+            {"product_code": product_code},
+            {"_id": 0}
+        ).batch_size(batch_size)
+
+    @staticmethod
+    def invalidate_cache(codes=None):
+        """Drop cached comments (all of them when codes is None)."""
+        if codes is None:
+            comment_cache.clear()
+        else:
+            for code in codes:
+                comment_cache.delete_prefix(f"{code}|")
 
 class ProductImage:
     @staticmethod
     def get_images_by_product_code(product_code):
+        return ProductImage.get_images_with_etag(product_code)[0]
+
+    @staticmethod
+    def get_images_with_etag(product_code):
+        """Return (images, etag); the ETag is computed once, when the cache is filled."""
+        found, entry = image_cache.get(product_code)
+        if found:
+            return entry
+
+        images = ProductImage._fetch_images(product_code)
+        entry = (images, content_etag(images))
+        image_cache.set(product_code, entry, ttl=None if images else Config.CACHE_NEGATIVE_TTL)
+        return entry
+
+    @staticmethod
+    def get_images_by_product_codes(product_codes):
+        """Image documents for several products with a single $in query; returns {code: images or None}."""
+        result = {}
+        missing = []
+        for code in product_codes:
+            found, entry = image_cache.get(code)
+            if found:
+                result[code] = entry[0]
+            else:
+                missing.append(code)
+        if not missing:
+            return result
+
+        client = MongoDBConnection.get_instance()
+        db = client.varejo
+        fetched = dict.fromkeys(missing)
+        for images in db.product_images.find(
+            {"product_code": {"$in": missing}},
+            {"_id": 0}
+        ):
+            fetched[images['product_code']] = images
+
+        for code, images in fetched.items():
+            image_cache.set(code, (images, content_etag(images)),
+                            ttl=None if images else Config.CACHE_NEGATIVE_TTL)
+        result.update(fetched)
+        return result
+
+    @staticmethod
+    def invalidate_cache(codes=None):
+        """Drop cached image documents (all of them when codes is None)."""
+        if codes is None:
+            image_cache.clear()
+        else:
+            for code in codes:
+                image_cache.delete(code)
+
+    @staticmethod
+    def _fetch_images(product_code):
         client = MongoDBConnection.get_instance()
         db = client.varejo
         return db.product_images.find_one(
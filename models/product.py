@@ -1,15 +1,16 @@
 from models.base_model import BaseModel
-import json
 from datetime import datetime
-import mysql.connector
-import os
-from ZODB import DB
-from ZODB.FileStorage import FileStorage
-from contextlib import contextmanager
+import threading
+import time
+from config import Config
+from utils.cache import product_cache
+from utils.mysql_pool import MySQLPool
+from utils.zodb import ZODBConnection
 
 class MySQLProduct:
     def __init__(self, id_produto, codigo_produto, nome_produto, descricao, 
-                 id_categoria, marca, preco_atual, unidade_medida, ativo):
+                 id_categoria, marca, preco_atual, unidade_medida, ativo,
+                 atualizado_em=None):
         self.id_produto = id_produto
         self.codigo_produto = codigo_produto
         self.nome_produto = nome_produto
@@ -19,6 +20,7 @@ class MySQLProduct:
         self.preco_atual = preco_atual
         self.unidade_medida = unidade_medida
         self.ativo = ativo
+        self.atualizado_em = atualizado_em
 
     def to_dict(self):
         return {
@@ -80,28 +82,36 @@ class ZODBProduct(BaseModel):
         }
 
 class Product:
+    # Columns clients may request through ?fields= on the listing endpoint
+    LIST_FIELDS = {
+        'id_produto': 'p.id_produto',
+        'codigo_produto': 'p.codigo_produto',
+        'nome_produto': 'p.nome_produto',
+        'descricao': 'p.descricao',
+        'id_categoria': 'p.id_categoria',
+        'marca': 'p.marca',
+        'preco_atual': 'p.preco_atual',
+        'unidade_medida': 'p.unidade_medida',
+        'ativo': 'p.ativo',
+        'atualizado_em': 'p.atualizado_em',
+        'categoria_nome': 'c.nome_categoria'
+    }
+
+    # Snapshot of the codes get_by_code can resolve, refreshed every PRODUCT_CODES_TTL seconds
+    _known_codes = None
+    _known_codes_loaded_at = 0.0
+    _known_codes_lock = threading.RLock()
+    # Set while a background thread rebuilds a stale snapshot; bumped by invalidate_known_codes
+    _known_codes_refreshing = False
+    _known_codes_generation = 0
+
     @staticmethod
     def get_mysql_connection():
-        return mysql.connector.connect(
-            host="mysql_db",
-            user=os.getenv('MYSQL_USER', 'user'),
-            password=os.getenv('MYSQL_PASSWORD', 'userpassword'),
-            database="VarejoBase"
-        )
+        return MySQLPool.get_connection("VarejoBase")
 
     @staticmethod
-    @contextmanager
     def get_zodb_connection():
-        os.makedirs('data', exist_ok=True)
-        storage = FileStorage('data/products.fs')
-        db = DB(storage)
-        connection = db.open()
-        try:
-            yield connection
-        finally:
-            connection.close()
-            db.close()
-            storage.close()
+        return ZODBConnection.connection()
 
     @classmethod
     def get_all(cls):
@@ -128,8 +138,311 @@ class Product:
             if 'conn' in locals():
                 conn.close()
 
+    @classmethod
+    def _load_known_codes(cls):
+        codes = set()
+        with cls.get_zodb_connection() as connection:
+            codes.update(connection.root().get('products', {}).keys())
+
+        try:
+            conn = cls.get_mysql_connection()
+            cursor = conn.cursor()
+            cursor.execute("SELECT codigo_produto FROM produto WHERE ativo = TRUE")
+            codes.update(row[0] for row in cursor.fetchall())
+        finally:
+            if 'cursor' in locals():
+                cursor.close()
+            if 'conn' in locals():
+                conn.close()
+        return frozenset(codes)
+
+    @classmethod
+    def _refresh_known_codes(cls, generation):
+        try:
+            codes = cls._load_known_codes()
+        except Exception:
+            codes = None  # Keep serving the old snapshot; the next request retries
+        with cls._known_codes_lock:
+            cls._known_codes_refreshing = False
+            # An invalidation during the scan makes this result stale already
+            if codes is not None and generation == cls._known_codes_generation:
+                cls._known_codes = codes
+                cls._known_codes_loaded_at = time.monotonic()
+
+    @classmethod
+    def get_known_codes(cls):
+        """Snapshot of the known product codes.
+
+        Only the first load (or the first after an invalidation) blocks; once
+        the snapshot is older than PRODUCT_CODES_TTL it keeps being served
+        while a single background thread rebuilds it.
+        """
+        with cls._known_codes_lock:
+            if cls._known_codes is None:
+                cls._known_codes = cls._load_known_codes()
+                cls._known_codes_loaded_at = time.monotonic()
+            elif (time.monotonic() - cls._known_codes_loaded_at > Config.PRODUCT_CODES_TTL
+                  and not cls._known_codes_refreshing):
+                cls._known_codes_refreshing = True
+                threading.Thread(target=cls._refresh_known_codes,
+                                 args=(cls._known_codes_generation,), daemon=True).start()
+            return cls._known_codes
+
+    @classmethod
+    def invalidate_known_codes(cls):
+        with cls._known_codes_lock:
+            cls._known_codes = None
+            cls._known_codes_generation += 1
+
+    @classmethod
+    def exists(cls, code):
+        """Cheap existence check backed by the in-memory code snapshot.
+
+        Codes missing from the snapshot may have been added after the last
+        refresh, so those fall back to a real get_by_code lookup.
+        """
+        if code in cls.get_known_codes():
+            return True
+        return cls.get_by_code(code) is not None
+
+    @classmethod
+    def iter_all(cls, batch_size=1000):
+        """Yield every active product without loading the catalog in memory.
+
+        Rows come from an unbuffered (server-side) cursor read with
+        fetchmany, so only one batch is held at a time.
+        """
+        conn = cls.get_mysql_connection()
+        cursor = conn.cursor(dictionary=True, buffered=False)
+        exhausted = False
+        try:
+            cursor.execute("""
+                SELECT p.*, c.nome_categoria as categoria_nome
+                FROM produto p
+                LEFT JOIN categoria c ON p.id_categoria = c.id_categoria
+                WHERE p.ativo = TRUE
+                ORDER BY p.id_produto
+            """)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    exhausted = True
+                    break
+                for row in rows:
+                    yield row
+        finally:
+            if not exhausted:
+                # The client went away mid-stream; drain the result so the
+                # connection goes back to the pool clean
+                conn.consume_results()
+            cursor.close()
+            conn.close()
+
+    @classmethod
+    def get_page(cls, after=None, limit=100, fields=None, id_categoria=None,
+                 marca=None, preco_min=None, preco_max=None, version=None):
+        """Keyset page of active products ordered by id_produto.
+
+        Returns (products, next_cursor); next_cursor is the id_produto to pass
+        as ``after`` for the following page, or None on the last page.
+        Cached pages are keyed by the catalog ``version`` (get_catalog_version()
+        when not given), so a write made through another process or a script
+        is not served from a page cached before it.
+        """
+        fields = fields or list(cls.LIST_FIELDS)
+        unknown = [field for field in fields if field not in cls.LIST_FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+        if 'id_produto' not in fields:
+            # The cursor is built from id_produto, so it is always returned
+            fields = ['id_produto'] + fields
+
+        columns = ', '.join(f"{cls.LIST_FIELDS[field]} AS {field}" for field in fields)
+        join = ("LEFT JOIN categoria c ON p.id_categoria = c.id_categoria"
+                if 'categoria_nome' in fields else "")
+
+        conditions = ["p.ativo = TRUE"]
+        params = []
+        if after is not None:
+            conditions.append("p.id_produto > %s")
+            params.append(after)
+        if id_categoria is not None:
+            conditions.append("p.id_categoria = %s")
+            params.append(id_categoria)
+        if marca is not None:
+            conditions.append("p.marca = %s")
+            params.append(marca)
+        if preco_min is not None:
+            conditions.append("p.preco_atual >= %s")
+            params.append(preco_min)
+        if preco_max is not None:
+            conditions.append("p.preco_atual <= %s")
+            params.append(preco_max)
+        # One extra row tells whether there is a next page
+        params.append(limit + 1)
+
+        if version is None:
+            version = cls.get_catalog_version()
+        cache_key = f"page|{version}|{columns}|{' AND '.join(conditions)}|{params}"
+        found, page = product_cache.get(cache_key)
+        if found:
+            return page
+
+        try:
+            conn = cls.get_mysql_connection()
+            cursor = conn.cursor(dictionary=True)
+
+            cursor.execute(f"""
+                SELECT {columns}
+                FROM produto p
+                {join}
+                WHERE {' AND '.join(conditions)}
+                ORDER BY p.id_produto
+                LIMIT %s
+            """, tuple(params))
+
+            products = cursor.fetchall()
+            next_cursor = None
+            if len(products) > limit:
+                products = products[:limit]
+                next_cursor = products[-1]['id_produto']
+            product_cache.set(cache_key, (products, next_cursor))
+            return products, next_cursor
+
+        except Exception as e:
+            raise Exception(f"Error fetching products: {str(e)}")
+
+        finally:
+            if 'cursor' in locals():
+                cursor.close()
+            if 'conn' in locals():
+                conn.close()
+
     @classmethod
     def get_by_code(cls, code):
+        found, product = product_cache.get(code)
+        if found:
+            return product
+
+        product = cls._fetch_by_code(code)
+        # Unknown codes are cached too, for a shorter time
+        product_cache.set(code, product, ttl=None if product else Config.CACHE_NEGATIVE_TTL)
+        return product
+
+    @classmethod
+    def get_many(cls, codes):
+        """Look up several products at once; returns {code: product or None}.
+
+        Cache misses are resolved with one ZODB pass and a single MySQL
+        ``IN`` query for whatever ZODB doesn't have.
+        """
+        result = {}
+        missing = []
+        for code in codes:
+            found, product = product_cache.get(code)
+            if found:
+                result[code] = product
+            else:
+                missing.append(code)
+        if not missing:
+            return result
+        fetched = list(missing)
+
+        try:
+            with cls.get_zodb_connection() as connection:
+                products = connection.root().get('products', {})
+                for code in missing:
+                    if code in products:
+                        result[code] = products[code].to_dict()
+
+            missing = [code for code in missing if code not in result]
+            if missing:
+                conn = cls.get_mysql_connection()
+                cursor = conn.cursor(dictionary=True)
+                placeholders = ', '.join(['%s'] * len(missing))
+                cursor.execute(f"""
+                    SELECT p.*, c.nome_categoria as categoria_nome
+                    FROM produto p
+                    LEFT JOIN categoria c ON p.id_categoria = c.id_categoria
+                    WHERE p.codigo_produto IN ({placeholders}) AND p.ativo = TRUE
+                """, tuple(missing))
+                # produto uses a case-insensitive collation, so a row may come back with
+                # different casing than the code asked for: key it by the requested code(s)
+                requested = {}
+                for code in missing:
+                    requested.setdefault(code.casefold(), []).append(code)
+                for row in cursor.fetchall():
+                    for code in requested.get(row['codigo_produto'].casefold(), []):
+                        result[code] = row
+
+        except Exception as e:
+            raise Exception(f"Error fetching products: {str(e)}")
+
+        finally:
+            if 'cursor' in locals():
+                cursor.close()
+            if 'conn' in locals():
+                conn.close()
+
+        for code in fetched:
+            product = result.setdefault(code, None)
+            product_cache.set(code, product, ttl=None if product else Config.CACHE_NEGATIVE_TTL)
+        return result
+
+    @staticmethod
+    def get_version(product):
+        """Last modification time of a product dict from ZODB or MySQL."""
+        if product.get('updated_at'):
+            return datetime.fromisoformat(product['updated_at'])
+        return product.get('atualizado_em')
+
+    @classmethod
+    def get_catalog_version(cls):
+        """(catalogo_versao counter, last atualizado_em) for the whole catalog.
+
+        The counter is bumped by triggers on every insert, update and delete
+        of produto, so it changes even when the row count and the
+        second-resolution atualizado_em don't. Cached for
+        CATALOG_VERSION_TTL seconds.
+        """
+        found, version = product_cache.get('catalog_version')
+        if found:
+            return version
+
+        try:
+            conn = cls.get_mysql_connection()
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT v.versao, (SELECT MAX(atualizado_em) FROM produto)
+                FROM catalogo_versao v
+                WHERE v.id = 1
+            """)
+            version = tuple(cursor.fetchone())
+        except Exception as e:
+            raise Exception(f"Error fetching catalog version: {str(e)}")
+        finally:
+            if 'cursor' in locals():
+                cursor.close()
+            if 'conn' in locals():
+                conn.close()
+
+        product_cache.set('catalog_version', version, ttl=Config.CATALOG_VERSION_TTL)
+        return version
+
+    @classmethod
+    def invalidate_cache(cls, codes=None):
+        """Drop cached products (all of them when codes is None) and listing pages."""
+        if codes is None:
+            product_cache.clear()
+        else:
+            for code in codes:
+                product_cache.delete(code)
+            product_cache.delete_prefix('page|')
+            product_cache.delete('catalog_version')
+        cls.invalidate_known_codes()
+
+    @classmethod
+    def _fetch_by_code(cls, code):
         try:
             # First try to get from ZODB for detailed info
             with cls.get_zodb_connection() as connection:
@@ -160,4 +473,7 @@ class Product:
             if 'cursor' in locals():
                 cursor.close()
             if 'conn' in locals():
-                conn.close() 
\ No newline at end of file
+                conn.close()
+
+# A new ZODB file means migrated products; forget what was cached from the old one
+ZODBConnection.add_reopen_listener(Product.invalidate_cache)
@@ -3,6 +3,7 @@
 
 from flask import Blueprint
 from controllers.product_controller import ProductController
+from controllers.metrics_controller import MetricsController
 
 # Create blueprint
 api = Blueprint('api', __name__)
@@ -13,11 +14,26 @@ api = Blueprint('api', __name__)
 def get_all_products():
     return ProductController.get_all_products()
 
+@api.route('/produtos/export', methods=['GET'])
+@api.route('/produtos/export/', methods=['GET'])
+def export_products():
+    return ProductController.export_products()
+
+@api.route('/produtos/batch', methods=['POST'])
+@api.route('/produtos/batch/', methods=['POST'])
+def get_products_batch():
+    return ProductController.get_products_batch()
+
 @api.route('/produtos/<code>', methods=['GET'])
 @api.route('/produtos/<code>/', methods=['GET'])
 def get_product_by_code(code):
     return ProductController.get_product_by_code(code)
 
+@api.route('/produtos/<code>/full', methods=['GET'])
+@api.route('/produtos/<code>/full/', methods=['GET'])
+def get_product_full(code):
+    return ProductController.get_product_full(code)
+
 @api.route('/produtos/<code>/comentarios', methods=['GET'])
 @api.route('/produtos/<code>/comentarios/', methods=['GET'])
 def get_product_comments(code):
@@ -26,4 +42,10 @@ def get_product_comments(code):
 @api.route('/produtos/<code>/imagens', methods=['GET'])
 @api.route('/produtos/<code>/imagens/', methods=['GET'])
 def get_product_images(code):
-    return ProductController.get_product_images(code) 
\ No newline at end of file
+    return ProductController.get_product_images(code)
+
+# Metrics routes
+@api.route('/metrics', methods=['GET'])
+@api.route('/metrics/', methods=['GET'])
+def get_metrics():
+    return MetricsController.get_metrics()
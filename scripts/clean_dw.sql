@@ -7,11 +7,14 @@ SET FOREIGN_KEY_CHECKS = 0;
 DROP TABLE IF EXISTS fato_vendas;
 DROP TABLE IF EXISTS fato_precos;
 DROP TABLE IF EXISTS fato_estoque;
+DROP TABLE IF EXISTS agg_vendas_mes_categoria_loja;
+DROP TABLE IF EXISTS agg_vendas_dia_produto;
 DROP TABLE IF EXISTS dim_tempo;
 DROP TABLE IF EXISTS dim_produto;
 DROP TABLE IF EXISTS dim_categoria;
 DROP TABLE IF EXISTS dim_loja;
 DROP TABLE IF EXISTS dim_cliente;
+DROP TABLE IF EXISTS etl_controle;
 
 -- Reabilitar verificação de chaves estrangeiras
 SET FOREIGN_KEY_CHECKS = 1; 
\ No newline at end of file
@@ -0,0 +1,64 @@
+import argparse
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datetime import datetime
+from utils.dw_partitions import (FACT_TABLES, add_months, drop_partitions_before, list_partitions,
+                                 month_id, month_start)
+from utils.mysql_pool import MySQLPool
+
+def get_mysql_connection():
+    return MySQLPool.get_connection("DW_Varejo")
+
+def listar_particoes(conn):
+    for tabela in FACT_TABLES:
+        particoes = list_partitions(conn, tabela)
+        if not particoes:
+            print(f"{tabela}: tabela sem particionamento")
+            continue
+        print(f"{tabela}: {len(particoes)} partições")
+        for nome, limite in particoes:
+            print(f"  {nome} < {limite if limite is not None else 'MAXVALUE'}")
+
+def aplicar_retencao(conn, manter_meses):
+    """Remove as partições dos fatos (e as linhas dos agregados) anteriores aos últimos manter_meses meses."""
+    corte = add_months(month_start(datetime.now().date()), -(manter_meses - 1))
+    id_corte = month_id(corte)
+
+    print(f"Mantendo dados a partir de {corte.strftime('%m/%Y')}")
+    for tabela in FACT_TABLES:
+        removidas = drop_partitions_before(conn, tabela, corte)
+        print(f"  {tabela}: {len(removidas)} partições removidas"
+              + (f" ({', '.join(removidas)})" if removidas else ""))
+
+    # Os agregados não são particionados, mas acompanham a retenção dos fatos
+    cursor = conn.cursor()
+    try:
+        for tabela in ('agg_vendas_mes_categoria_loja', 'agg_vendas_dia_produto'):
+            cursor.execute(f"DELETE FROM {tabela} WHERE id_tempo < %s", (id_corte,))
+            print(f"  {tabela}: {cursor.rowcount} linhas removidas")
+        conn.commit()
+    finally:
+        cursor.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Partições das tabelas fato do DW_Varejo")
+    parser.add_argument('--manter-meses', type=int,
+                        help="remove as partições anteriores aos últimos N meses (incluindo o atual)")
+    args = parser.parse_args()
+
+    conn = get_mysql_connection()
+    try:
+        if args.manter_meses:
+            if args.manter_meses < 1:
+                parser.error("--manter-meses deve ser pelo menos 1")
+            aplicar_retencao(conn, args.manter_meses)
+        listar_particoes(conn)
+    except Exception as e:
+        print(f"Erro ao gerenciar partições: {str(e)}")
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
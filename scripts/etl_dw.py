@@ -1,8 +1,20 @@
+import argparse
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import multiprocessing
+import time
 import mysql.connector
 import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
-import calendar
-import os
+from config import Config
+from utils.bulk_loader import BulkLoader
+from utils.dw_partitions import ensure_partitions, month_start, next_month, truncate_month
+from utils.etl_pipeline import extract_batches, run_pipeline
+from utils.etl_scheduler import Task, print_report, run_tasks
+from utils.mysql_pool import MySQLPool
 
 # Database connection settings
 SOURCE_CONFIG = {
@@ -24,105 +36,153 @@ def connect_to_db(config):
     cursor = conn.cursor(dictionary=True)
     return conn, cursor
 
-def load_dim_tempo(dw_conn, start_date, end_date):
-    cursor = dw_conn.cursor()
-    
-    # Generate dates
-    date_range = pd.date_range(start=start_date, end=end_date)
-    
-    for date in date_range:
-        id_tempo = int(date.strftime('%Y%m%d'))
-        dia = date.day
-        mes = date.month
-        ano = date.year
-        trimestre = (mes - 1) // 3 + 1
-        dia_semana = calendar.day_name[date.weekday()]
-        
-        cursor.execute("""
-        INSERT IGNORE INTO dim_tempo 
-        (id_tempo, data, dia, mes, ano, trimestre, dia_semana)
-        VALUES (%s, %s, %s, %s, %s, %s, %s)
-        """, (id_tempo, date.date(), dia, mes, ano, trimestre, dia_semana))
-    
-    dw_conn.commit()
+def build_calendar(start_date, end_date):
+    """Monta o calendário de start_date a end_date de forma vetorizada (uma linha por dia)."""
+    dates = pd.date_range(start=start_date, end=end_date)
+    iso = dates.isocalendar()
+    return pd.DataFrame({
+        'id_tempo': dates.year * 10000 + dates.month * 100 + dates.day,
+        'data': dates.date,
+        'dia': dates.day,
+        'mes': dates.month,
+        'ano': dates.year,
+        'trimestre': dates.quarter,
+        'dia_semana': dates.day_name(),
+        'ano_mes': dates.year * 100 + dates.month,
+        'semana_iso': iso['year'].values.astype(int) * 100 + iso['week'].values.astype(int),
+        'fim_de_semana': dates.dayofweek >= 5,
+        'inicio_mes': (dates - pd.to_timedelta(dates.day - 1, unit='D')).date
+    })
+
+def get_calendar_bounds(src_conn, dw_conn, data_snapshot=None):
+    """Período que dim_tempo precisa cobrir e o que já está carregado."""
+    cursor = src_conn.cursor()
+    cursor.execute("SELECT MIN(DATE(data_venda)), MAX(DATE(data_venda)) FROM venda")
+    min_venda, max_venda = cursor.fetchone()
+    cursor.close()
+
+    # fato_precos e fato_estoque usam a data de hoje (ou a data do backfill)
+    hoje = datetime.now().date()
+    data_snapshot = data_snapshot or hoje
+    # Começa no dia 1 do mês: os agregados mensais usam o id_tempo do primeiro dia
+    start_date = min(min_venda or hoje, hoje, data_snapshot).replace(day=1)
+    end_date = max(max_venda or hoje, hoje, data_snapshot)
 
-def load_dim_categoria(src_cursor, dw_conn):
     cursor = dw_conn.cursor()
+    cursor.execute("SELECT MIN(data), MAX(data) FROM dim_tempo")
+    loaded = cursor.fetchone()
+    cursor.close()
+    return start_date, end_date, loaded
+
+def load_dim_tempo(src_conn, dw_conn, data_snapshot=None):
+    loader = BulkLoader(dw_conn, 'dim_tempo',
+                        ['id_tempo', 'data', 'dia', 'mes', 'ano', 'trimestre', 'dia_semana',
+                         'ano_mes', 'semana_iso', 'fim_de_semana', 'inicio_mes'],
+                        mode='ignore')
+
+    start_date, end_date, (loaded_start, loaded_end) = get_calendar_bounds(src_conn, dw_conn, data_snapshot)
+
+    # Só gera os dias que faltam antes e depois do período já carregado
+    if loaded_start is None:
+        ranges = [(start_date, end_date)]
+    else:
+        ranges = [(start_date, loaded_start - timedelta(days=1)),
+                  (loaded_end + timedelta(days=1), end_date)]
+
+    for range_start, range_end in ranges:
+        if range_start > range_end:
+            continue
+        calendar_df = build_calendar(range_start, range_end)
+        # astype(object) turns NumPy scalars into Python values the connector understands
+        loader.load(calendar_df.astype(object).itertuples(index=False, name=None))
+    return loader.report()
+
+def load_dim_categoria(src_conn, dw_conn):
+    loader = BulkLoader(dw_conn, 'dim_categoria',
+                        ['id_categoria', 'nome_categoria', 'descricao'], mode='ignore')
     
     # Extract categories
-    src_cursor.execute("SELECT * FROM categoria")
-    categorias = src_cursor.fetchall()
-    
-    for cat in categorias:
-        cursor.execute("""
-        INSERT IGNORE INTO dim_categoria 
-        (id_categoria, nome_categoria, descricao)
-        VALUES (%s, %s, %s)
-        """, (cat['id_categoria'], cat['nome_categoria'], cat.get('descricao')))
+    batches = extract_batches(src_conn, "SELECT * FROM categoria")
     
-    dw_conn.commit()
+    run_pipeline(batches,
+                 lambda cat: (cat['id_categoria'], cat['nome_categoria'], cat.get('descricao')),
+                 loader)
+    return loader.report()
 
-def load_dim_produto(src_cursor, dw_conn):
-    cursor = dw_conn.cursor()
+def load_dim_produto(src_conn, dw_conn):
+    loader = BulkLoader(dw_conn, 'dim_produto',
+                        ['id_produto', 'nome_produto', 'marca', 'id_categoria', 'unidade_medida'],
+                        mode='ignore')
     
     # Extract products with category information
-    src_cursor.execute("""
+    batches = extract_batches(src_conn, """
         SELECT p.*, c.nome_categoria 
         FROM produto p
         LEFT JOIN categoria c ON p.id_categoria = c.id_categoria
     """)
-    produtos = src_cursor.fetchall()
-    
-    for prod in produtos:
-        cursor.execute("""
-        INSERT IGNORE INTO dim_produto 
-        (id_produto, nome_produto, marca, id_categoria, unidade_medida)
-        VALUES (%s, %s, %s, %s, %s)
-        """, (prod['id_produto'], prod['nome_produto'], prod['marca'], 
-              prod['id_categoria'], prod['unidade_medida']))
     
-    dw_conn.commit()
+    run_pipeline(batches,
+                 lambda prod: (prod['id_produto'], prod['nome_produto'], prod['marca'],
+                               prod['id_categoria'], prod['unidade_medida']),
+                 loader)
+    return loader.report()
 
-def load_dim_loja(src_cursor, dw_conn):
-    cursor = dw_conn.cursor()
+def load_dim_loja(src_conn, dw_conn):
+    loader = BulkLoader(dw_conn, 'dim_loja',
+                        ['id_loja', 'nome_loja', 'cidade', 'estado'], mode='ignore')
     
-    src_cursor.execute("SELECT * FROM loja")
-    lojas = src_cursor.fetchall()
+    batches = extract_batches(src_conn, "SELECT * FROM loja")
     
-    for loja in lojas:
-        cursor.execute("""
-        INSERT IGNORE INTO dim_loja 
-        (id_loja, nome_loja, cidade, estado)
-        VALUES (%s, %s, %s, %s)
-        """, (loja['id_loja'], loja['nome_loja'], loja['cidade'], loja['estado']))
-    
-    dw_conn.commit()
+    run_pipeline(batches,
+                 lambda loja: (loja['id_loja'], loja['nome_loja'], loja['cidade'], loja['estado']),
+                 loader)
+    return loader.report()
 
-def load_dim_cliente(src_cursor, dw_conn):
-    cursor = dw_conn.cursor()
+def load_dim_cliente(src_conn, dw_conn):
+    loader = BulkLoader(dw_conn, 'dim_cliente',
+                        ['id_cliente', 'nome_cliente', 'cidade', 'estado'], mode='ignore')
     
-    src_cursor.execute("SELECT * FROM cliente")
-    clientes = src_cursor.fetchall()
+    batches = extract_batches(src_conn, "SELECT * FROM cliente")
     
-    for cliente in clientes:
-        cursor.execute("""
-        INSERT IGNORE INTO dim_cliente 
-        (id_cliente, nome_cliente, cidade, estado)
-        VALUES (%s, %s, %s, %s)
-        """, (cliente['id_cliente'], cliente['nome'], 
-              cliente['cidade'], cliente['estado']))
-    
-    dw_conn.commit()
+    run_pipeline(batches,
+                 lambda cliente: (cliente['id_cliente'], cliente['nome'],
+                                  cliente['cidade'], cliente['estado']),
+                 loader)
+    return loader.report()
 
-def load_fato_vendas(src_cursor, dw_conn):
+def get_watermark(dw_conn, tabela):
     cursor = dw_conn.cursor()
+    cursor.execute("SELECT ultimo_id FROM etl_controle WHERE tabela = %s", (tabela,))
+    row = cursor.fetchone()
+    cursor.close()
+    return row[0] if row else 0
+
+def set_watermark(dw_conn, tabela, ultimo_id, ultima_data=None):
+    cursor = dw_conn.cursor()
+    cursor.execute("""
+        INSERT INTO etl_controle (tabela, ultimo_id, ultima_data)
+        VALUES (%s, %s, %s)
+        ON DUPLICATE KEY UPDATE ultimo_id = VALUES(ultimo_id), ultima_data = VALUES(ultima_data)
+    """, (tabela, ultimo_id, ultima_data))
+    dw_conn.commit()
+    cursor.close()
+
+def load_fato_vendas_range(src_conn, dw_conn, ultimo_id, max_id, data_inicio, data_fim):
+    """Carrega os itens com id_item em (ultimo_id, max_id] vendidos entre data_inicio e data_fim."""
+    # The natural key (id_venda, id_item) is unique in the fact, so re-runs are no-ops
+    loader = BulkLoader(dw_conn, 'fato_vendas',
+                        ['id_venda', 'id_item', 'id_tempo', 'id_produto', 'id_categoria', 'id_loja',
+                         'id_cliente', 'quantidade', 'valor_total', 'desconto_total', 'forma_pagamento'],
+                        mode='ignore')
     
     # Extract sales data with all necessary information
-    src_cursor.execute("""
+    batches = extract_batches(src_conn, """
         SELECT 
             v.id_venda,
+            iv.id_item,
             DATE(v.data_venda) as data_venda,
             iv.id_produto,
+            p.id_categoria,
             v.id_loja,
             v.id_cliente,
             iv.quantidade,
@@ -131,175 +191,396 @@ def load_fato_vendas(src_cursor, dw_conn):
             v.forma_pagamento
         FROM venda v
         JOIN item_venda iv ON v.id_venda = iv.id_venda
-    """)
-    vendas = src_cursor.fetchall()
-    
-    for venda in vendas:
-        # Create time dimension key
-        id_tempo = int(venda['data_venda'].strftime('%Y%m%d'))
-        
-        cursor.execute("""
-        INSERT IGNORE INTO fato_vendas 
-        (id_tempo, id_produto, id_loja, id_cliente, 
-         quantidade, valor_total, desconto_total, forma_pagamento)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-        """, (id_tempo, venda['id_produto'], venda['id_loja'], 
-              venda['id_cliente'], venda['quantidade'], venda['valor_total'],
-              venda['desconto_total'], venda['forma_pagamento']))
+        JOIN produto p ON p.id_produto = iv.id_produto
+        WHERE iv.id_item > %s AND iv.id_item <= %s
+        AND v.data_venda >= %s AND v.data_venda < %s
+    """, (ultimo_id, max_id, data_inicio, data_fim + timedelta(days=1)))
     
+    # Create time dimension key
+    run_pipeline(batches, lambda venda: (
+        venda['id_venda'], venda['id_item'],
+        int(venda['data_venda'].strftime('%Y%m%d')), venda['id_produto'],
+        venda['id_categoria'], venda['id_loja'], venda['id_cliente'], venda['quantidade'],
+        venda['valor_total'], venda['desconto_total'], venda['forma_pagamento']
+    ), loader)
+    return loader.report()
+
+def _load_fato_vendas_partition(ultimo_id, max_id, data_inicio, data_fim):
+    # Runs in a worker process, with its own connection pools
+    return with_connections(load_fato_vendas_range, ultimo_id, max_id, data_inicio, data_fim)()
+
+def split_date_range(data_inicio, data_fim, partes):
+    total_dias = (data_fim - data_inicio).days + 1
+    passo = -(-total_dias // partes)  # ceil
+    faixas = []
+    inicio = data_inicio
+    while inicio <= data_fim:
+        fim = min(inicio + timedelta(days=passo - 1), data_fim)
+        faixas.append((inicio, fim))
+        inicio = fim + timedelta(days=1)
+    return faixas
+
+def backfill_categoria_vendas(dw_conn):
+    # Linhas carregadas antes de id_categoria ser gravado no fato
+    cursor = dw_conn.cursor()
+    cursor.execute("""
+        UPDATE fato_vendas f
+        JOIN dim_produto p ON p.id_produto = f.id_produto
+        SET f.id_categoria = p.id_categoria
+        WHERE f.id_categoria IS NULL
+    """)
+    if cursor.rowcount > 0:
+        # Linhas antigas mudaram de categoria: os agregados são refeitos do zero
+        set_watermark(dw_conn, 'agg_vendas', 0)
     dw_conn.commit()
+    cursor.close()
+
+def load_fato_vendas(full_refresh=False, processes=None, recarregar_mes=None):
+    processes = processes or Config.ETL_VENDAS_PROCESSES
+    # Cada carga é (ultimo_id, max_id, data_inicio, data_fim)
+    cargas = []
+    source_conn = get_mysql_connection("VarejoBase")
+    dw_conn = get_mysql_connection("DW_Varejo")
+    try:
+        if full_refresh:
+            cursor = dw_conn.cursor()
+            cursor.execute("TRUNCATE TABLE fato_vendas")
+            cursor.close()
+            set_watermark(dw_conn, 'fato_vendas', 0)
+            # TRUNCATE reinicia id_fato, então os agregados também recomeçam
+            set_watermark(dw_conn, 'agg_vendas', 0)
+        else:
+            backfill_categoria_vendas(dw_conn)
+
+        # Só os itens novos desde a última carga (marca d'água em item_venda.id_item)
+        ultimo_id = get_watermark(dw_conn, 'fato_vendas')
 
-def load_fato_precos(src_cursor, dw_conn):
+        if recarregar_mes and ultimo_id > 0:
+            # Esvazia a partição do mês e recarrega os itens dele já carregados antes;
+            # as linhas recarregadas ganham id_fato novo e entram nos agregados
+            inicio_mes = month_start(recarregar_mes)
+            fim_mes = next_month(inicio_mes) - timedelta(days=1)
+            truncate_month(dw_conn, 'fato_vendas', inicio_mes)
+            # Os agregados do mês são zerados já: se a origem não tiver mais itens no mês,
+            # nenhuma linha nova passaria pelo refresh_agg_vendas para corrigi-los
+            cursor = dw_conn.cursor()
+            try:
+                recompute_agg_vendas(cursor, int(inicio_mes.strftime('%Y%m%d')),
+                                     int(fim_mes.strftime('%Y%m%d')))
+                dw_conn.commit()
+            except Exception:
+                dw_conn.rollback()
+                raise
+            finally:
+                cursor.close()
+            cargas.append((0, ultimo_id, inicio_mes, fim_mes))
+
+        cursor = source_conn.cursor()
+        cursor.execute("""
+            SELECT MAX(iv.id_item), MIN(DATE(v.data_venda)), MAX(DATE(v.data_venda))
+            FROM item_venda iv
+            JOIN venda v ON v.id_venda = iv.id_venda
+            WHERE iv.id_item > %s
+        """, (ultimo_id,))
+        max_id, data_inicio, data_fim = cursor.fetchone()
+        cursor.close()
+
+        if max_id is not None:
+            # Cada faixa de datas é carregada por um processo
+            cargas += [(ultimo_id, max_id, inicio, fim)
+                       for inicio, fim in split_date_range(data_inicio, data_fim, processes)]
+            criadas = ensure_partitions(dw_conn, 'fato_vendas', data_inicio, data_fim)
+            if criadas:
+                print(f"  fato_vendas: partições criadas: {', '.join(criadas)}")
+    finally:
+        source_conn.close()
+        dw_conn.close()
+
+    if not cargas:
+        print("  fato_vendas: nenhum item novo")
+        return []
+
+    if len(cargas) == 1:
+        reports = [_load_fato_vendas_partition(*cargas[0])]
+    else:
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=min(len(cargas), processes), mp_context=context) as executor:
+            futures = [executor.submit(_load_fato_vendas_partition, *carga) for carga in cargas]
+            reports = [future.result() for future in futures]
+
+    if max_id is not None:
+        # Só avança a marca d'água quando todas as faixas foram carregadas
+        dw_conn = get_mysql_connection("DW_Varejo")
+        try:
+            set_watermark(dw_conn, 'fato_vendas', max_id, data_fim)
+        finally:
+            dw_conn.close()
+    return reports
+
+def recompute_agg_vendas(cursor, min_tempo, max_tempo):
+    """Refaz os agregados dos dias min_tempo..max_tempo (e dos meses inteiros que os contêm).
+
+    Não faz commit: quem chama decide a transação. Retorna (linhas_mes, linhas_dia).
+    """
+    # id_tempo é AAAAMMDD: o mês vai de AAAAMM01 a AAAAMM31
+    inicio_mes = min_tempo // 100 * 100 + 1
+    fim_mes = max_tempo // 100 * 100 + 31
+
+    cursor.execute("""
+        DELETE FROM agg_vendas_mes_categoria_loja WHERE id_tempo BETWEEN %s AND %s
+    """, (inicio_mes, fim_mes))
+    cursor.execute("""
+        INSERT INTO agg_vendas_mes_categoria_loja
+            (id_tempo, id_categoria, id_loja, num_vendas, quantidade, valor_total, desconto_total, max_id_fato)
+        SELECT 
+            f.id_tempo DIV 100 * 100 + 1,
+            f.id_categoria,
+            f.id_loja,
+            COUNT(*),
+            SUM(f.quantidade),
+            SUM(f.valor_total),
+            SUM(f.desconto_total),
+            MAX(f.id_fato)
+        FROM fato_vendas f
+        WHERE f.id_tempo BETWEEN %s AND %s
+        GROUP BY f.id_tempo DIV 100 * 100 + 1, f.id_categoria, f.id_loja
+    """, (inicio_mes, fim_mes))
+    linhas_mes = cursor.rowcount
+
+    cursor.execute("""
+        DELETE FROM agg_vendas_dia_produto WHERE id_tempo BETWEEN %s AND %s
+    """, (min_tempo, max_tempo))
+    cursor.execute("""
+        INSERT INTO agg_vendas_dia_produto
+            (id_tempo, id_produto, id_categoria, num_vendas, quantidade, valor_total, desconto_total)
+        SELECT 
+            f.id_tempo,
+            f.id_produto,
+            MAX(f.id_categoria),
+            COUNT(*),
+            SUM(f.quantidade),
+            SUM(f.valor_total),
+            SUM(f.desconto_total)
+        FROM fato_vendas f
+        WHERE f.id_tempo BETWEEN %s AND %s
+        GROUP BY f.id_tempo, f.id_produto
+    """, (min_tempo, max_tempo))
+    linhas_dia = cursor.rowcount
+    return linhas_mes, linhas_dia
+
+def refresh_agg_vendas():
+    """Recalcula os agregados de vendas dos dias/meses que receberam linhas novas em fato_vendas."""
+    dw_conn = get_mysql_connection("DW_Varejo")
+    cursor = dw_conn.cursor()
+    try:
+        # Marca d'água em id_fato: as linhas novas são as de id_fato maior que a última agregada
+        ultimo_id = get_watermark(dw_conn, 'agg_vendas')
+        if ultimo_id == 0:
+            cursor.execute("DELETE FROM agg_vendas_mes_categoria_loja")
+            cursor.execute("DELETE FROM agg_vendas_dia_produto")
+        cursor.execute("""
+            SELECT MIN(id_tempo), MAX(id_tempo), MAX(id_fato)
+            FROM fato_vendas
+            WHERE id_fato > %s
+        """, (ultimo_id,))
+        min_tempo, max_tempo, max_id = cursor.fetchone()
+        if max_id is None:
+            dw_conn.commit()
+            print("  agregados de vendas: nada a atualizar")
+            return {'dias': 0}
+
+        linhas_mes, linhas_dia = recompute_agg_vendas(cursor, min_tempo, max_tempo)
+
+        # Agregados e marca d'água na mesma transação
+        cursor.execute("""
+            INSERT INTO etl_controle (tabela, ultimo_id)
+            VALUES ('agg_vendas', %s)
+            ON DUPLICATE KEY UPDATE ultimo_id = VALUES(ultimo_id)
+        """, (max_id,))
+        dw_conn.commit()
+    except Exception:
+        dw_conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        dw_conn.close()
+
+    print(f"  agregados de vendas: {min_tempo} a {max_tempo} "
+          f"({linhas_mes} linhas mês x categoria x loja, {linhas_dia} linhas dia x produto)")
+    return {'de': min_tempo, 'ate': max_tempo, 'linhas_mes': linhas_mes, 'linhas_dia': linhas_dia}
+
+def load_snapshot(dw_conn, loader, data, batches, transform):
+    """Troca a foto do dia numa única transação (apaga e recarrega)."""
+    id_tempo = int(data.strftime('%Y%m%d'))
+    # Antes da transação: ALTER TABLE faz commit implícito
+    ensure_partitions(dw_conn, loader.table, data, data)
     cursor = dw_conn.cursor()
+    try:
+        cursor.execute(f"DELETE FROM {loader.table} WHERE id_tempo = %s", (id_tempo,))
+        run_pipeline(batches, transform, loader)
+        dw_conn.commit()
+    except Exception:
+        dw_conn.rollback()
+        raise
+    finally:
+        cursor.close()
+    return loader.report()
+
+def load_fato_precos(src_conn, dw_conn, data=None):
+    data = data or datetime.now().date()
+    id_tempo = int(data.strftime('%Y%m%d'))
+    loader = BulkLoader(dw_conn, 'fato_precos',
+                        ['id_tempo', 'id_produto', 'id_categoria', 'preco_normal',
+                         'preco_promocional', 'preco_compra', 'margem_lucro', 'em_promocao'],
+                        commit=False)
     
     # Extract price data from products, promotions and suppliers
-    src_cursor.execute("""
+    # (uma linha por produto: menor preço entre as promoções vigentes na data e entre os fornecedores)
+    batches = extract_batches(src_conn, """
         SELECT 
             p.id_produto,
             p.id_categoria,
             p.preco_atual as preco_normal,
-            pp.preco_promocional,
-            pf.preco_compra,
+            promo.preco_promocional,
+            forn.preco_compra,
             CASE 
-                WHEN pp.preco_promocional IS NOT NULL 
-                THEN ((p.preco_atual - pp.preco_promocional) / p.preco_atual) * 100
-                ELSE ((p.preco_atual - pf.preco_compra) / p.preco_atual) * 100
+                WHEN promo.preco_promocional IS NOT NULL 
+                THEN ((p.preco_atual - promo.preco_promocional) / p.preco_atual) * 100
+                ELSE ((p.preco_atual - forn.preco_compra) / p.preco_atual) * 100
             END as margem_lucro,
-            pp.id_promocao IS NOT NULL as em_promocao,
-            CURDATE() as data_atual
+            promo.preco_promocional IS NOT NULL as em_promocao
         FROM produto p
-        LEFT JOIN produto_promocao pp ON p.id_produto = pp.id_produto
-        LEFT JOIN produto_fornecedor pf ON p.id_produto = pf.id_produto
+        LEFT JOIN (
+            SELECT pp.id_produto, MIN(pp.preco_promocional) as preco_promocional
+            FROM produto_promocao pp
+            JOIN promocao pr ON pr.id_promocao = pp.id_promocao
+            WHERE pr.ativa = TRUE
+            AND (pr.data_inicio IS NULL OR pr.data_inicio <= %s)
+            AND (pr.data_fim IS NULL OR pr.data_fim >= %s)
+            GROUP BY pp.id_produto
+        ) promo ON promo.id_produto = p.id_produto
+        LEFT JOIN (
+            SELECT id_produto, MIN(preco_compra) as preco_compra
+            FROM produto_fornecedor
+            GROUP BY id_produto
+        ) forn ON forn.id_produto = p.id_produto
         WHERE p.ativo = TRUE
-    """)
-    precos = src_cursor.fetchall()
+    """, (data, data))
     
-    for preco in precos:
-        # Get or create time dimension record
-        data = preco['data_atual']
-        id_tempo = int(data.strftime('%Y%m%d'))
-        
-        cursor.execute("""
-        INSERT INTO fato_precos 
-        (id_tempo, id_produto, id_categoria, preco_normal, 
-         preco_promocional, preco_compra, margem_lucro, em_promocao)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-        """, (
-            id_tempo,
-            preco['id_produto'],
-            preco['id_categoria'],
-            preco['preco_normal'],
-            preco['preco_promocional'],
-            preco['preco_compra'],
-            preco['margem_lucro'],
-            preco['em_promocao']
-        ))
-    
-    dw_conn.commit()
+    return load_snapshot(dw_conn, loader, data, batches, lambda preco: (
+        id_tempo,
+        preco['id_produto'],
+        preco['id_categoria'],
+        preco['preco_normal'],
+        preco['preco_promocional'],
+        preco['preco_compra'],
+        preco['margem_lucro'],
+        preco['em_promocao']
+    ))
 
-def load_fato_estoque(src_cursor, dw_conn):
-    cursor = dw_conn.cursor()
+def load_fato_estoque(src_conn, dw_conn, data=None):
+    data = data or datetime.now().date()
+    id_tempo = int(data.strftime('%Y%m%d'))
+    loader = BulkLoader(dw_conn, 'fato_estoque',
+                        ['id_tempo', 'id_produto', 'id_loja', 'quantidade_atual',
+                         'quantidade_minima', 'quantidade_maxima', 'dias_estoque', 'status_estoque'],
+                        commit=False)
     
-    # Extract inventory data
-    src_cursor.execute("""
+    # Vendas dos 30 dias até a data agregadas uma única vez por (produto, loja) e juntadas ao estoque;
+    # dias de estoque e status são calculados no próprio MySQL
+    batches = extract_batches(src_conn, """
         SELECT 
-            e.*,
-            CURDATE() as data_atual,
-            COALESCE(
-                (SELECT SUM(iv.quantidade) 
-                 FROM item_venda iv 
-                 JOIN venda v ON iv.id_venda = v.id_venda 
-                 WHERE iv.id_produto = e.id_produto 
-                 AND v.id_loja = e.id_loja 
-                 AND v.data_venda >= DATE_SUB(CURDATE(), INTERVAL 30 DAY)
-                ), 0) as vendas_30_dias
+            e.id_produto,
+            e.id_loja,
+            e.quantidade_atual,
+            e.quantidade_minima,
+            e.quantidade_maxima,
+            CASE
+                WHEN COALESCE(v30.vendas_30_dias, 0) > 0
+                THEN FLOOR(e.quantidade_atual * 30 / v30.vendas_30_dias)
+                ELSE 999
+            END as dias_estoque,
+            CASE
+                WHEN e.quantidade_atual <= e.quantidade_minima AND e.quantidade_atual = 0 THEN 'Crítico'
+                WHEN e.quantidade_atual <= e.quantidade_minima THEN 'Baixo'
+                WHEN e.quantidade_atual >= e.quantidade_maxima THEN 'Excesso'
+                ELSE 'Normal'
+            END as status_estoque
         FROM estoque e
-    """)
-    estoques = src_cursor.fetchall()
-    
-    for estoque in estoques:
-        # Get or create time dimension record
-        data = estoque['data_atual']
-        id_tempo = int(data.strftime('%Y%m%d'))
-        
-        # Calculate days of inventory
-        vendas_diarias = estoque['vendas_30_dias'] / 30
-        dias_estoque = int(estoque['quantidade_atual'] / vendas_diarias) if vendas_diarias > 0 else 999
-        
-        # Determine inventory status
-        if estoque['quantidade_atual'] <= estoque['quantidade_minima']:
-            status = 'Crítico' if estoque['quantidade_atual'] == 0 else 'Baixo'
-        elif estoque['quantidade_atual'] >= estoque['quantidade_maxima']:
-            status = 'Excesso'
-        else:
-            status = 'Normal'
-        
-        cursor.execute("""
-        INSERT INTO fato_estoque 
-        (id_tempo, id_produto, id_loja, quantidade_atual, 
-         quantidade_minima, quantidade_maxima, dias_estoque, status_estoque)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-        """, (
-            id_tempo,
-            estoque['id_produto'],
-            estoque['id_loja'],
-            estoque['quantidade_atual'],
-            estoque['quantidade_minima'],
-            estoque['quantidade_maxima'],
-            dias_estoque,
-            status
-        ))
+        LEFT JOIN (
+            SELECT iv.id_produto, v.id_loja, SUM(iv.quantidade) as vendas_30_dias
+            FROM venda v
+            JOIN item_venda iv ON iv.id_venda = v.id_venda
+            WHERE v.data_venda >= DATE_SUB(%s, INTERVAL 30 DAY)
+            AND v.data_venda < DATE_ADD(%s, INTERVAL 1 DAY)
+            GROUP BY iv.id_produto, v.id_loja
+        ) v30 ON v30.id_produto = e.id_produto AND v30.id_loja = e.id_loja
+    """, (data, data))
     
-    dw_conn.commit()
+    return load_snapshot(dw_conn, loader, data, batches, lambda estoque: (
+        id_tempo, estoque['id_produto'], estoque['id_loja'],
+        estoque['quantidade_atual'], estoque['quantidade_minima'], estoque['quantidade_maxima'],
+        int(estoque['dias_estoque']), estoque['status_estoque']
+    ))
 
 def get_mysql_connection(database):
-    return mysql.connector.connect(
-        host="mysql_db",
-        user=os.getenv('MYSQL_USER', 'user'),
-        password=os.getenv('MYSQL_PASSWORD', 'userpassword'),
-        database=database
-    )
-
-def etl_process():
-    try:
-        # Conexões com os bancos
+    return MySQLPool.get_connection(database)
+
+def with_connections(loader, *args):
+    """Wrap a loader(src_conn, dw_conn, ...) so it runs on its own pooled connections."""
+    def run():
         source_conn = get_mysql_connection("VarejoBase")
         dw_conn = get_mysql_connection("DW_Varejo")
-        
-        source_cursor = source_conn.cursor(dictionary=True)
-        dw_cursor = dw_conn.cursor(dictionary=True)
-
-        # ETL para dimensões
-        print("Carregando dimensões...")
-        load_dim_categoria(source_cursor, dw_conn)
-        load_dim_produto(source_cursor, dw_conn)
-        load_dim_loja(source_cursor, dw_conn)
-        load_dim_cliente(source_cursor, dw_conn)
-        
-        # Carregar dimensão tempo com um período de 5 anos
-        start_date = datetime(2020, 1, 1)
-        end_date = datetime(2025, 12, 31)
-        load_dim_tempo(dw_conn, start_date, end_date)
-
-        # ETL para fatos
-        print("Carregando fatos...")
-        load_fato_vendas(source_cursor, dw_conn)
-        load_fato_precos(source_cursor, dw_conn)
-        load_fato_estoque(source_cursor, dw_conn)
-
-        print("ETL concluído com sucesso!")
+        try:
+            return loader(source_conn, dw_conn, *args)
+        finally:
+            source_conn.close()
+            dw_conn.close()
+    return run
+
+def etl_process(full_refresh=False, data_snapshot=None, recarregar_mes=None):
+    try:
+        # Dimensões em paralelo; cada fato começa assim que suas dimensões terminam
+        tasks = [
+            Task('dim_categoria', with_connections(load_dim_categoria)),
+            Task('dim_produto', with_connections(load_dim_produto), ['dim_categoria']),
+            Task('dim_loja', with_connections(load_dim_loja)),
+            Task('dim_cliente', with_connections(load_dim_cliente)),
+            Task('dim_tempo', with_connections(load_dim_tempo, data_snapshot)),
+            Task('fato_vendas', lambda: load_fato_vendas(full_refresh=full_refresh,
+                                                         recarregar_mes=recarregar_mes),
+                 ['dim_tempo', 'dim_produto', 'dim_loja', 'dim_cliente']),
+            Task('agg_vendas', refresh_agg_vendas, ['fato_vendas']),
+            # Fotos do dia: recarregar a mesma data substitui a foto anterior
+            Task('fato_precos', with_connections(load_fato_precos, data_snapshot),
+                 ['dim_tempo', 'dim_produto']),
+            Task('fato_estoque', with_connections(load_fato_estoque, data_snapshot),
+                 ['dim_tempo', 'dim_produto', 'dim_loja']),
+        ]
+
+        print("Carregando dimensões e fatos...")
+        started = time.perf_counter()
+        report = run_tasks(tasks, max_workers=Config.ETL_WORKERS)
+        print_report(report)
+        print(f"Tempo total: {time.perf_counter() - started:.2f}s")
+
+        falhas = [name for name, entry in report.items() if entry['status'] != 'ok']
+        if falhas:
+            print(f"ETL concluído com falhas em: {', '.join(falhas)}")
+        else:
+            print("ETL concluído com sucesso!")
 
     except Exception as e:
         print(f"Error during ETL process: {str(e)}")
-    finally:
-        if 'source_cursor' in locals():
-            source_cursor.close()
-        if 'source_conn' in locals():
-            source_conn.close()
-        if 'dw_cursor' in locals():
-            dw_cursor.close()
-        if 'dw_conn' in locals():
-            dw_conn.close()
 
 if __name__ == "__main__":
-    etl_process() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="ETL do VarejoBase para o DW_Varejo")
+    parser.add_argument('--full-refresh', action='store_true',
+                        help="recarrega fato_vendas do zero em vez de só os itens novos")
+    parser.add_argument('--data', type=lambda value: datetime.strptime(value, '%Y-%m-%d').date(),
+                        help="data (AAAA-MM-DD) das fotos de fato_precos e fato_estoque; padrão: hoje")
+    parser.add_argument('--recarregar-mes', type=lambda value: datetime.strptime(value, '%Y-%m').date(),
+                        help="mês (AAAA-MM) de fato_vendas a esvaziar e recarregar da origem")
+    args = parser.parse_args()
+    etl_process(full_refresh=args.full_refresh, data_snapshot=args.data,
+                recarregar_mes=args.recarregar_mes)
@@ -2,23 +2,22 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-import mysql.connector
 from ZODB import DB
 from ZODB.FileStorage import FileStorage
 import transaction
-from models.product import MySQLProduct, ZODBProduct
+from config import Config
+from models.product import MySQLProduct, ZODBProduct, Product
+from utils.mysql_pool import MySQLPool
 
 def get_mysql_connection():
-    return mysql.connector.connect(
-        host="mysql_db",  # Docker container name
-        user="user",
-        password="userpassword",
-        database="VarejoBase"
-    )
+    return MySQLPool.get_connection("VarejoBase")
 
 def migrate_products():
-    os.makedirs('data', exist_ok=True)
-    storage = FileStorage('data/products.fs')
+    # Same file the API serves (ZODB_PATH)
+    directory = os.path.dirname(Config.ZODB_PATH)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    storage = FileStorage(Config.ZODB_PATH)
     
     # Connect to MySQL
     mysql_conn = get_mysql_connection()
@@ -49,6 +48,9 @@ def migrate_products():
         # Commit the transaction
         transaction.commit()
         print(f"Successfully migrated {len(mysql_products)} products to ZODB")
+
+        # Products were rewritten; drop what the API cached
+        Product.invalidate_cache()
         
     except Exception as e:
         print(f"Error during migration: {str(e)}")
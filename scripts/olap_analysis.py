@@ -1,42 +1,254 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import time
+import numpy as np
 import pandas as pd
-import mysql.connector
 import plotly.graph_objects as go
-from datetime import datetime
-import os
+from utils.mysql_pool import MySQLPool
+from utils.dw_fetch import fetch_columns, fetch_frame
+from utils.olap_cache import DIMENSION_EXTRACTS, FACT_EXTRACTS, OLAPCache
+from utils.olap_reports import write_reports
+
+# Dimensões que as consultas de vendas podem agrupar: expressão e a dimensão que precisa ser juntada
+SALES_DIMENSIONS = {
+    'ano': ('t.ano', 'tempo'),
+    'mes': ('t.mes', 'tempo'),
+    'trimestre': ('t.trimestre', 'tempo'),
+    'ano_mes': ('t.ano_mes', 'tempo'),
+    'inicio_mes': ('t.inicio_mes', 'tempo'),
+    'data': ('t.data', 'tempo'),
+    'dia_semana': ('t.dia_semana', 'tempo'),
+    'nome_categoria': ('c.nome_categoria', 'categoria'),
+    'nome_produto': ('p.nome_produto', 'produto'),
+    'marca': ('p.marca', 'produto'),
+    'estado': ('l.estado', 'loja'),
+    'cidade': ('l.cidade', 'loja'),
+}
+
+SALES_JOINS = {
+    'tempo': 'JOIN dim_tempo t ON s.id_tempo = t.id_tempo',
+    'categoria': 'JOIN dim_categoria c ON s.id_categoria = c.id_categoria',
+    'produto': 'JOIN dim_produto p ON s.id_produto = p.id_produto',
+    'loja': 'JOIN dim_loja l ON s.id_loja = l.id_loja',
+}
+
+MONTH_DIMENSIONS = {'ano', 'mes', 'trimestre', 'ano_mes', 'inicio_mes'}
+
+ROLLUP_MEASURES = {
+    'num_vendas': 'SUM(s.num_vendas)',
+    'total_quantidade': 'SUM(s.quantidade)',
+    'total_valor': 'SUM(s.valor_total)',
+    'total_desconto': 'SUM(s.desconto_total)',
+    'media_valor': 'SUM(s.valor_total) / SUM(s.num_vendas)',
+}
+
+# Fontes de vendas da menor para a maior; cada consulta usa a primeira que a responde
+SALES_SOURCES = [
+    {
+        'table': 'agg_vendas_mes_categoria_loja',
+        'dimensions': MONTH_DIMENSIONS | {'nome_categoria', 'estado', 'cidade'},
+        'measures': dict(ROLLUP_MEASURES, num_lojas='COUNT(DISTINCT s.id_loja)'),
+    },
+    {
+        'table': 'agg_vendas_dia_produto',
+        'dimensions': MONTH_DIMENSIONS | {'data', 'dia_semana', 'nome_categoria', 'nome_produto', 'marca'},
+        'measures': ROLLUP_MEASURES,
+    },
+    {
+        'table': 'fato_vendas',
+        'dimensions': set(SALES_DIMENSIONS),
+        'measures': {
+            'num_vendas': 'COUNT(*)',
+            'total_quantidade': 'SUM(s.quantidade)',
+            'total_valor': 'SUM(s.valor_total)',
+            'total_desconto': 'SUM(s.desconto_total)',
+            'media_valor': 'AVG(s.valor_total)',
+            # Contagens distintas não somam entre agregados: só o fato responde
+            'num_clientes': 'COUNT(DISTINCT s.id_cliente)',
+            'num_lojas': 'COUNT(DISTINCT s.id_loja)',
+        },
+    },
+]
+
+# Cubo de vendas em memória: dimensões que ele responde e como cada medida é agregada
+CUBE_DIMENSIONS = {'ano', 'mes', 'trimestre', 'ano_mes', 'inicio_mes', 'nome_categoria', 'estado', 'cidade'}
+
+CUBE_MEASURES = {
+    'num_vendas': ('valor_total', 'size'),
+    'total_quantidade': ('quantidade', 'sum'),
+    'total_valor': ('valor_total', 'sum'),
+    'total_desconto': ('desconto_total', 'sum'),
+    'media_valor': ('valor_total', 'mean'),
+    'num_clientes': ('id_cliente', 'nunique'),
+    'num_lojas': ('id_loja', 'nunique'),
+}
+
+def _categorical(ids, names):
+    """Categorical de `names` (dict id -> nome) indexado pelos ids do fato; ids sem nome viram NaN."""
+    categories = sorted(set(names.values()))
+    position = {name: code for code, name in enumerate(categories)}
+    lookup = np.full(max(list(names) + [int(ids.max()) if len(ids) else 0]) + 1, -1, dtype=np.int32)
+    for key, name in names.items():
+        lookup[key] = position[name]
+    return pd.Categorical.from_codes(lookup[ids], categories)
+
+def _nullable_ids(ids):
+    """Ids do extrato com 0 no lugar de NULL (COALESCE) como inteiros anuláveis.
+
+    Assim o nunique do cubo ignora as vendas sem cliente/loja, como o
+    COUNT(DISTINCT ...) das consultas ao MySQL.
+    """
+    ids = np.asarray(ids)
+    return pd.arrays.IntegerArray(ids, ids == 0)
 
 class OLAPAnalyzer:
     def __init__(self):
-        self.conn = mysql.connector.connect(
-            host="mysql_db",
-            user=os.getenv('MYSQL_USER', 'user'),
-            password=os.getenv('MYSQL_PASSWORD', 'userpassword'),
-            database="DW_Varejo"
-        )
-        self.cursor = self.conn.cursor(dictionary=True)
+        self.conn = MySQLPool.get_connection("DW_Varejo")
+        # Tabelas lidas pela última consulta de vendas
+        self.sources_used = []
+        # Preenchido por load_sales_cube(); enquanto for None as consultas vão ao MySQL
+        self.cube = None
+        # Gráficos das análises (nome do arquivo sem .html -> figura), gravados juntos por write_reports
+        self.figures = {}
 
     def __del__(self):
-        if hasattr(self, 'cursor'):
-            self.cursor.close()
         if hasattr(self, 'conn'):
             self.conn.close()
 
+    def load_sales_cube(self, use_cache=True):
+        """Carrega fato_vendas uma única vez para um DataFrame colunar compacto.
+
+        Só as chaves e medidas do fato são lidas; tempo vem de id_tempo (AAAAMMDD)
+        e categoria/loja são juntadas em memória como categorias. Com pyarrow
+        instalado, os meses já baixados vêm do cache local (utils/olap_cache.py)
+        e o MySQL só é consultado para os meses novos ou alterados.
+        """
+        started = time.perf_counter()
+        if use_cache and OLAPCache.available():
+            cache = OLAPCache(self.conn)
+            atualizados = cache.refresh('fato_vendas')
+            print(f"Cache OLAP: {len(atualizados)} meses atualizados do DW")
+            vendas = cache.read('fato_vendas')
+            if vendas is None:
+                vendas = pd.DataFrame({name: np.empty(0, dtype) for name, _, dtype in FACT_EXTRACTS['fato_vendas']})
+            categorias = cache.read_dimension('dim_categoria').to_dict('records')
+            lojas = cache.read_dimension('dim_loja').to_dict('records')
+        else:
+            vendas = fetch_columns(self.conn, 'fato_vendas', FACT_EXTRACTS['fato_vendas'])
+            categorias = fetch_frame(self.conn, DIMENSION_EXTRACTS['dim_categoria'],
+                                     categories=False).to_dict('records')
+            lojas = fetch_frame(self.conn, DIMENSION_EXTRACTS['dim_loja'], categories=False).to_dict('records')
+
+        ids = {name: np.asarray(vendas[name]) for name in ('id_tempo', 'id_categoria', 'id_loja')}
+        ano_mes = ids['id_tempo'] // 100
+        mes = (ano_mes % 100).astype(np.int16)
+        categorias = {row['id_categoria']: row['nome_categoria'] for row in categorias}
+
+        self.cube = pd.DataFrame({
+            'ano': (ano_mes // 100).astype(np.int16),
+            'mes': mes,
+            'trimestre': ((mes - 1) // 3 + 1).astype(np.int8),
+            'ano_mes': ano_mes,
+            'nome_categoria': _categorical(ids['id_categoria'], categorias),
+            'estado': _categorical(ids['id_loja'], {l['id_loja']: l['estado'] for l in lojas}),
+            'cidade': _categorical(ids['id_loja'], {l['id_loja']: l['cidade'] for l in lojas}),
+            'id_loja': _nullable_ids(ids['id_loja']),
+            'id_cliente': _nullable_ids(vendas['id_cliente']),
+            'quantidade': np.asarray(vendas['quantidade']),
+            'valor_total': np.asarray(vendas['valor_total']),
+            'desconto_total': np.asarray(vendas['desconto_total']),
+        })
+        print(f"Cubo de vendas: {len(self.cube)} linhas em {time.perf_counter() - started:.2f}s "
+              f"({self.cube.memory_usage(deep=True).sum() / 1024 / 1024:.1f} MB)")
+        return self.cube
+
+    def _query_cube(self, dimensions, measures, order_by=None, limit=None):
+        # inicio_mes sai de ano_mes depois do groupby
+        keys = ['ano_mes' if d == 'inicio_mes' else d for d in dimensions]
+        result = self.cube.groupby(keys, observed=True, sort=False).agg(
+            **{m: CUBE_MEASURES[m] for m in measures}).reset_index()
+        if 'inicio_mes' in dimensions:
+            result['inicio_mes'] = pd.to_datetime((result['ano_mes'] * 100 + 1).astype(str), format='%Y%m%d')
+        result = result[list(dimensions) + list(measures)]
+        if order_by:
+            result = result.sort_values([c for c, _ in order_by], ascending=[a for _, a in order_by])
+        if limit:
+            result = result.head(limit)
+        self.sources_used = ['cubo']
+        # Categorias voltam como texto, como nas consultas ao MySQL
+        for column in result.select_dtypes('category'):
+            result[column] = result[column].astype(object)
+        return result.to_dict('records')
+
+    def _sales_source(self, dimensions, measure):
+        for source in SALES_SOURCES:
+            if set(dimensions) <= source['dimensions'] and measure in source['measures']:
+                return source
+        raise ValueError(f"Nenhuma tabela de vendas responde a {measure} por {', '.join(dimensions)}")
+
+    def query_sales(self, dimensions, measures, order_by=None, limit=None):
+        """Agrega vendas por `dimensions`, lendo cada medida da menor tabela que a responde.
+
+        Medidas aditivas vêm dos agregados mantidos pelo ETL; contagens distintas
+        (clientes) vêm de fato_vendas. Quando mais de uma tabela é usada, os
+        resultados são juntados pelas dimensões. Com o cubo carregado
+        (load_sales_cube), as dimensões que ele tem são respondidas em memória.
+        `order_by` é uma lista de (coluna, ascendente). Retorna uma lista de
+        dicts, como o fetchall.
+        """
+        if self.cube is not None and set(dimensions) <= CUBE_DIMENSIONS:
+            return self._query_cube(dimensions, measures, order_by, limit)
+
+        by_source = {}
+        for measure in measures:
+            source = self._sales_source(dimensions, measure)
+            by_source.setdefault(source['table'], (source, []))[1].append(measure)
+
+        order_sql = ''
+        if order_by:
+            order_sql = 'ORDER BY ' + ', '.join(
+                column if ascending else f"{column} DESC" for column, ascending in order_by)
+        single_source = len(by_source) == 1
+
+        frames = []
+        self.sources_used = []
+        for table, (source, source_measures) in by_source.items():
+            joins = {SALES_DIMENSIONS[d][1] for d in dimensions}
+            select = [f"{SALES_DIMENSIONS[d][0]} as {d}" for d in dimensions]
+            select += [f"{source['measures'][m]} as {m}" for m in source_measures]
+            query = f"""
+            SELECT {', '.join(select)}
+            FROM {table} s
+            {' '.join(SALES_JOINS[j] for j in SALES_JOINS if j in joins)}
+            {'GROUP BY ' + ', '.join(SALES_DIMENSIONS[d][0] for d in dimensions) if dimensions else ''}
+            {order_sql if single_source else ''}
+            {f'LIMIT {int(limit)}' if limit and single_source else ''}
+            """
+            frame = fetch_frame(self.conn, query, categories=False)
+            self.sources_used.append(table)
+            if single_source:
+                return frame.to_dict('records')
+            frames.append(frame)
+
+        df = frames[0]
+        for frame in frames[1:]:
+            df = df.merge(frame, on=list(dimensions), how='outer')
+        if order_by:
+            df = df.sort_values([c for c, _ in order_by], ascending=[a for _, a in order_by])
+        if limit:
+            df = df.head(limit)
+        return df.to_dict('records')
+
     def analyze_by_time_and_category(self):
         """Análise de vendas por tempo e categoria"""
-        query = """
-        SELECT 
-            t.ano,
-            t.mes,
-            t.trimestre,
-            c.nome_categoria,
-            SUM(f.valor_total) as total_valor
-        FROM fato_vendas f
-        JOIN dim_tempo t ON f.id_tempo = t.id_tempo
-        JOIN dim_categoria c ON f.id_categoria = c.id_categoria
-        GROUP BY t.ano, t.mes, t.trimestre, c.nome_categoria
-        ORDER BY t.ano, t.mes, total_valor DESC
-        """
-        self.cursor.execute(query)
-        df = pd.DataFrame(self.cursor.fetchall())
+        rows = self.query_sales(
+            ['ano', 'mes', 'trimestre', 'nome_categoria'], ['total_valor'],
+            order_by=[('ano', True), ('mes', True), ('total_valor', False)]
+        )
+        df = pd.DataFrame(rows)
         
         if len(df) > 0:
             # Criar coluna ano-trimestre
@@ -65,27 +277,13 @@ class OLAPAnalyzer:
 
     def analyze_trends(self):
         """Análise de tendências de vendas"""
-        query = """
-        SELECT 
-            t.ano,
-            t.mes,
-            SUM(CAST(f.valor_total AS DECIMAL(10,2))) as total_valor,
-            COUNT(*) as num_vendas
-        FROM fato_vendas f
-        JOIN dim_tempo t ON f.id_tempo = t.id_tempo
-        GROUP BY t.ano, t.mes
-        ORDER BY t.ano, t.mes
-        """
-        self.cursor.execute(query)
-        df = pd.DataFrame(self.cursor.fetchall())
+        rows = self.query_sales(['inicio_mes'], ['total_valor', 'num_vendas'],
+                                order_by=[('inicio_mes', True)])
+        df = pd.DataFrame(rows)
         
         if len(df) > 0:
-            # Criar datas manualmente
-            df['data'] = df.apply(lambda x: datetime(year=int(x['ano']), month=int(x['mes']), day=1), axis=1)
-            
-            # Converter para tipos numéricos
-            df['total_valor'] = pd.to_numeric(df['total_valor'], errors='coerce')
-            df['num_vendas'] = pd.to_numeric(df['num_vendas'], errors='coerce')
+            # inicio_mes já vem calculado em dim_tempo
+            df['data'] = pd.to_datetime(df['inicio_mes'])
             
             # Criar gráfico de linha
             fig = go.Figure()
@@ -122,68 +320,32 @@ class OLAPAnalyzer:
         return None
 
     def analyze_by_category(self):
-        query = """
-        SELECT 
-            c.nome_categoria,
-            COUNT(*) as num_vendas,
-            SUM(f.quantidade) as total_quantidade,
-            SUM(f.valor_total) as total_valor,
-            SUM(f.desconto_total) as total_desconto,
-            AVG(f.valor_total) as media_valor,
-            COUNT(DISTINCT f.id_cliente) as num_clientes
-        FROM fato_vendas f
-        JOIN dim_categoria c ON f.id_categoria = c.id_categoria
-        GROUP BY c.nome_categoria
-        ORDER BY total_valor DESC
-        """
-        self.cursor.execute(query)
-        return self.cursor.fetchall()
+        return self.query_sales(
+            ['nome_categoria'],
+            ['num_vendas', 'total_quantidade', 'total_valor', 'total_desconto', 'media_valor', 'num_clientes'],
+            order_by=[('total_valor', False)]
+        )
 
     def analyze_by_location(self):
         """Análise de vendas por localização"""
         # Análise por estado
-        query_estado = """
-        SELECT 
-            l.estado,
-            COUNT(*) as num_vendas,
-            COUNT(DISTINCT f.id_cliente) as num_clientes,
-            COUNT(DISTINCT l.id_loja) as num_lojas,
-            SUM(CAST(f.quantidade AS DECIMAL(10,2))) as total_quantidade,
-            SUM(CAST(f.valor_total AS DECIMAL(10,2))) as total_valor,
-            AVG(CAST(f.valor_total AS DECIMAL(10,2))) as ticket_medio
-        FROM fato_vendas f
-        JOIN dim_loja l ON f.id_loja = l.id_loja
-        GROUP BY l.estado
-        ORDER BY total_valor DESC
-        """
-        self.cursor.execute(query_estado)
-        resultados_estado = self.cursor.fetchall()
+        resultados_estado = self.query_sales(
+            ['estado'],
+            ['num_vendas', 'num_clientes', 'num_lojas', 'total_quantidade', 'total_valor', 'media_valor'],
+            order_by=[('total_valor', False)]
+        )
+        for estado in resultados_estado:
+            estado['ticket_medio'] = estado.pop('media_valor')
 
         # Análise por cidade
-        query_cidade = """
-        SELECT 
-            l.cidade,
-            l.estado,
-            COUNT(*) as num_vendas,
-            COUNT(DISTINCT f.id_cliente) as num_clientes,
-            SUM(CAST(f.valor_total AS DECIMAL(10,2))) as total_valor
-        FROM fato_vendas f
-        JOIN dim_loja l ON f.id_loja = l.id_loja
-        GROUP BY l.cidade, l.estado
-        ORDER BY total_valor DESC
-        LIMIT 10
-        """
-        self.cursor.execute(query_cidade)
-        resultados_cidade = self.cursor.fetchall()
+        resultados_cidade = self.query_sales(
+            ['cidade', 'estado'], ['num_vendas', 'num_clientes', 'total_valor'],
+            order_by=[('total_valor', False)], limit=10
+        )
 
         # Criar gráfico de barras por estado
         df_estado = pd.DataFrame(resultados_estado)
         if len(df_estado) > 0:
-            # Converter para tipos numéricos
-            numeric_columns = ['total_valor', 'num_vendas', 'num_clientes', 'num_lojas', 'total_quantidade', 'ticket_medio']
-            for col in numeric_columns:
-                df_estado[col] = pd.to_numeric(df_estado[col], errors='coerce')
-            
             # Criar gráfico de barras horizontal
             fig = go.Figure(data=[
                 go.Bar(
@@ -228,39 +390,57 @@ class OLAPAnalyzer:
             }
         return None
 
+    def _top_series(self, query_template, nomes):
+        """Série completa só dos produtos escolhidos (nome_produto IN ...)."""
+        if not nomes:
+            return pd.DataFrame(columns=['data', 'nome_produto'])
+        placeholders = ', '.join(['%s'] * len(nomes))
+        return fetch_frame(self.conn, query_template.format(produtos=placeholders), tuple(nomes))
+
     def analyze_price_trends(self):
         """Análise histórica de preços"""
-        query = """
+        # Resumo por produto calculado no MySQL: primeiro/último preço via ROW_NUMBER
+        resumo = fetch_frame(self.conn, """
+        WITH precos AS (
+            SELECT 
+                p.nome_produto,
+                t.data,
+                fp.preco_normal,
+                ROW_NUMBER() OVER (PARTITION BY p.nome_produto ORDER BY t.data) as ordem,
+                ROW_NUMBER() OVER (PARTITION BY p.nome_produto ORDER BY t.data DESC) as ordem_desc
+            FROM fato_precos fp
+            JOIN dim_tempo t ON fp.id_tempo = t.id_tempo
+            JOIN dim_produto p ON fp.id_produto = p.id_produto
+            JOIN dim_categoria c ON fp.id_categoria = c.id_categoria
+        )
         SELECT 
-            t.data,
-            c.nome_categoria,
-            p.nome_produto,
-            CAST(fp.preco_normal AS DECIMAL(10,2)) as preco_normal,
-            CAST(fp.preco_promocional AS DECIMAL(10,2)) as preco_promocional,
-            CAST(fp.preco_compra AS DECIMAL(10,2)) as preco_compra,
-            CAST(fp.margem_lucro AS DECIMAL(10,2)) as margem_lucro,
-            fp.em_promocao
-        FROM fato_precos fp
-        JOIN dim_tempo t ON fp.id_tempo = t.id_tempo
-        JOIN dim_produto p ON fp.id_produto = p.id_produto
-        JOIN dim_categoria c ON fp.id_categoria = c.id_categoria
-        ORDER BY t.data, c.nome_categoria, p.nome_produto
-        """
-        self.cursor.execute(query)
-        df = pd.DataFrame(self.cursor.fetchall())
+            nome_produto,
+            MAX(CASE WHEN ordem = 1 THEN preco_normal END) as preco_inicial,
+            MAX(CASE WHEN ordem_desc = 1 THEN preco_normal END) as preco_final,
+            AVG(preco_normal) as preco_medio,
+            MIN(preco_normal) as preco_minimo,
+            MAX(preco_normal) as preco_maximo,
+            MIN(data) as data_inicial,
+            MAX(data) as data_final
+        FROM precos
+        GROUP BY nome_produto
+        """, categories=False)
         
-        if len(df) > 0:
-            # Converter colunas para tipos numéricos
-            numeric_columns = ['preco_normal', 'preco_promocional', 'preco_compra', 'margem_lucro']
-            for col in numeric_columns:
-                df[col] = pd.to_numeric(df[col], errors='coerce')
-            
+        if len(resumo) > 0:
             # Criar gráfico de linha para evolução de preços por produto
             fig_produtos = go.Figure()
             
-            # Selecionar os 10 produtos mais caros para melhor visualização
-            top_produtos = df.groupby('nome_produto')['preco_normal'].mean().nlargest(10).index
-            df_top = df[df['nome_produto'].isin(top_produtos)]
+            # Selecionar os 10 produtos mais caros para melhor visualização; só a série deles é lida
+            top_produtos = resumo.nlargest(10, 'preco_medio')['nome_produto'].tolist()
+            df_top = self._top_series("""
+            SELECT t.data, p.nome_produto, fp.preco_normal
+            FROM fato_precos fp
+            JOIN dim_tempo t ON fp.id_tempo = t.id_tempo
+            JOIN dim_produto p ON fp.id_produto = p.id_produto
+            JOIN dim_categoria c ON fp.id_categoria = c.id_categoria
+            WHERE p.nome_produto IN ({produtos})
+            ORDER BY t.data
+            """, top_produtos)
             
             for produto in df_top['nome_produto'].unique():
                 df_prod = df_top[df_top['nome_produto'] == produto]
@@ -283,11 +463,21 @@ class OLAPAnalyzer:
             # Criar gráfico de linha para evolução de preços por categoria
             fig_categorias = go.Figure()
             
-            df_cat = df.groupby(['data', 'nome_categoria']).agg({
-                'preco_normal': 'mean',
-                'preco_promocional': 'mean',
-                'margem_lucro': 'mean'
-            }).reset_index()
+            # Médias diárias por categoria agregadas no MySQL
+            df_cat = fetch_frame(self.conn, """
+            SELECT 
+                t.data,
+                c.nome_categoria,
+                AVG(fp.preco_normal) as preco_normal,
+                AVG(fp.preco_promocional) as preco_promocional,
+                AVG(fp.margem_lucro) as margem_lucro
+            FROM fato_precos fp
+            JOIN dim_tempo t ON fp.id_tempo = t.id_tempo
+            JOIN dim_produto p ON fp.id_produto = p.id_produto
+            JOIN dim_categoria c ON fp.id_categoria = c.id_categoria
+            GROUP BY t.data, c.nome_categoria
+            ORDER BY t.data, c.nome_categoria
+            """)
             
             for categoria in df_cat['nome_categoria'].unique():
                 df_cat_filtered = df_cat[df_cat['nome_categoria'] == categoria]
@@ -328,15 +518,20 @@ class OLAPAnalyzer:
                 showlegend=True
             )
             
-            # Salvar gráficos
-            fig_produtos.write_html('analise_historica_precos_produtos.html')
-            fig_categorias.write_html('analise_historica_precos_categorias.html')
-            fig_margem.write_html('analise_historica_margem_lucro.html')
-            
-            # Calcular variação de preços
-            df_variacao = df.groupby('nome_produto').agg({
-                'preco_normal': ['first', 'last', 'mean', 'min', 'max'],
-                'data': ['first', 'last']
+            self.figures['analise_historica_precos_produtos'] = fig_produtos
+            self.figures['analise_historica_precos_categorias'] = fig_categorias
+            self.figures['analise_historica_margem_lucro'] = fig_margem
+            
+            # Variação de preços a partir do resumo (mesmo formato de colunas usado no main)
+            resumo = resumo.set_index('nome_produto')
+            df_variacao = pd.DataFrame({
+                ('preco_normal', 'first'): resumo['preco_inicial'],
+                ('preco_normal', 'last'): resumo['preco_final'],
+                ('preco_normal', 'mean'): resumo['preco_medio'],
+                ('preco_normal', 'min'): resumo['preco_minimo'],
+                ('preco_normal', 'max'): resumo['preco_maximo'],
+                ('data', 'first'): resumo['data_inicial'],
+                ('data', 'last'): resumo['data_final']
             })
             
             df_variacao['variacao_percentual'] = ((df_variacao[('preco_normal', 'last')] - 
@@ -348,40 +543,64 @@ class OLAPAnalyzer:
 
     def analyze_inventory_trends(self):
         """Análise histórica de estoque"""
-        query = """
-        SELECT 
-            t.data,
-            c.nome_categoria,
-            p.nome_produto,
-            l.nome_loja,
-            CAST(fe.quantidade_atual AS DECIMAL(10,2)) as quantidade_atual,
-            CAST(fe.quantidade_minima AS DECIMAL(10,2)) as quantidade_minima,
-            CAST(fe.quantidade_maxima AS DECIMAL(10,2)) as quantidade_maxima,
-            CAST(fe.dias_estoque AS DECIMAL(10,2)) as dias_estoque,
-            fe.status_estoque
-        FROM fato_estoque fe
-        JOIN dim_tempo t ON fe.id_tempo = t.id_tempo
-        JOIN dim_produto p ON fe.id_produto = p.id_produto
-        JOIN dim_categoria c ON p.id_categoria = c.id_categoria
-        JOIN dim_loja l ON fe.id_loja = l.id_loja
-        ORDER BY t.data, c.nome_categoria, p.nome_produto
+        # Linhas do fato já com as dimensões; reaproveitada pelas consultas abaixo
+        estoque = """
+            SELECT 
+                t.data,
+                fe.id_loja,
+                c.nome_categoria,
+                p.nome_produto,
+                fe.quantidade_atual,
+                fe.quantidade_minima,
+                fe.quantidade_maxima,
+                fe.dias_estoque,
+                fe.status_estoque
+            FROM fato_estoque fe
+            JOIN dim_tempo t ON fe.id_tempo = t.id_tempo
+            JOIN dim_produto p ON fe.id_produto = p.id_produto
+            JOIN dim_categoria c ON p.id_categoria = c.id_categoria
+            JOIN dim_loja l ON fe.id_loja = l.id_loja
         """
-        self.cursor.execute(query)
-        df = pd.DataFrame(self.cursor.fetchall())
+        # Resumo por produto no MySQL: primeiro/último valor via ROW_NUMBER
+        resumo = fetch_frame(self.conn, f"""
+        WITH estoque AS ({estoque}),
+        ordenado AS (
+            SELECT 
+                estoque.*,
+                ROW_NUMBER() OVER (PARTITION BY nome_produto ORDER BY data, id_loja) as ordem,
+                ROW_NUMBER() OVER (PARTITION BY nome_produto ORDER BY data DESC, id_loja DESC) as ordem_desc
+            FROM estoque
+        )
+        SELECT 
+            nome_produto,
+            MAX(CASE WHEN ordem = 1 THEN quantidade_atual END) as quantidade_inicial,
+            MAX(CASE WHEN ordem_desc = 1 THEN quantidade_atual END) as quantidade_final,
+            AVG(quantidade_atual) as quantidade_media,
+            MIN(quantidade_atual) as quantidade_atual_min,
+            MAX(quantidade_atual) as quantidade_atual_max,
+            AVG(dias_estoque) as dias_medio,
+            MIN(dias_estoque) as dias_minimo,
+            MAX(dias_estoque) as dias_maximo,
+            MIN(data) as data_inicial,
+            MAX(data) as data_final,
+            MAX(CASE WHEN ordem_desc = 1 THEN status_estoque END) as status_atual
+        FROM ordenado
+        GROUP BY nome_produto
+        """, categories=False)
         
-        if len(df) > 0:
-            # Converter colunas para tipos numéricos
-            numeric_columns = ['quantidade_atual', 'quantidade_minima', 'quantidade_maxima', 'dias_estoque']
-            for col in numeric_columns:
-                df[col] = pd.to_numeric(df[col], errors='coerce')
-            
+        if len(resumo) > 0:
             # Criar gráfico de linha para evolução do estoque por produto
             fig_produtos = go.Figure()
             
-            # Calcular variação de estoque
-            df['variacao_estoque'] = df.groupby('nome_produto')['quantidade_atual'].transform(lambda x: x.max() - x.min())
-            top_produtos = df.groupby('nome_produto')['variacao_estoque'].mean().nlargest(10).index
-            df_top = df[df['nome_produto'].isin(top_produtos)]
+            # Top 10 em variação (máximo - mínimo); só a série deles é lida
+            resumo['variacao_estoque'] = resumo['quantidade_atual_max'] - resumo['quantidade_atual_min']
+            top_produtos = resumo.nlargest(10, 'variacao_estoque')['nome_produto'].tolist()
+            df_top = self._top_series(f"""
+            SELECT data, nome_produto, quantidade_atual
+            FROM ({estoque}) estoque
+            WHERE nome_produto IN ({{produtos}})
+            ORDER BY data
+            """, top_produtos)
             
             for produto in df_top['nome_produto'].unique():
                 df_prod = df_top[df_top['nome_produto'] == produto]
@@ -404,12 +623,28 @@ class OLAPAnalyzer:
             # Criar gráfico de linha para evolução do estoque por categoria
             fig_categorias = go.Figure()
             
-            df_cat = df.groupby(['data', 'nome_categoria']).agg({
-                'quantidade_atual': 'sum',
-                'quantidade_minima': 'sum',
-                'quantidade_maxima': 'sum',
-                'dias_estoque': 'mean'
-            }).reset_index()
+            # Uma única leitura agrupada (dia x categoria x status) alimenta os totais por
+            # categoria e a contagem por status; o resultado é pequeno e é reagrupado no pandas
+            df_dia = fetch_frame(self.conn, f"""
+            SELECT 
+                data,
+                nome_categoria,
+                status_estoque,
+                COUNT(*) as total,
+                SUM(quantidade_atual) as quantidade_atual,
+                SUM(quantidade_minima) as quantidade_minima,
+                SUM(quantidade_maxima) as quantidade_maxima,
+                SUM(dias_estoque) as soma_dias,
+                COUNT(dias_estoque) as linhas_dias
+            FROM ({estoque}) estoque
+            GROUP BY data, nome_categoria, status_estoque
+            """, categories=False)
+            
+            # Totais diários por categoria; a média de dias é refeita a partir de soma e contagem
+            df_cat = df_dia.groupby(['data', 'nome_categoria'])[
+                ['quantidade_atual', 'quantidade_minima', 'quantidade_maxima', 'soma_dias', 'linhas_dias']
+            ].sum().reset_index()
+            df_cat['dias_estoque'] = df_cat['soma_dias'] / df_cat['linhas_dias'].replace(0, np.nan)
             
             for categoria in df_cat['nome_categoria'].unique():
                 df_cat_filtered = df_cat[df_cat['nome_categoria'] == categoria]
@@ -451,7 +686,7 @@ class OLAPAnalyzer:
             )
             
             # Criar gráfico de área para evolução do status de estoque
-            df_status = df.groupby(['data', 'status_estoque']).size().unstack(fill_value=0)
+            df_status = df_dia.groupby(['data', 'status_estoque'])['total'].sum().unstack(fill_value=0)
             
             fig_status = go.Figure()
             
@@ -472,17 +707,24 @@ class OLAPAnalyzer:
                 showlegend=True
             )
             
-            # Salvar gráficos
-            fig_produtos.write_html('analise_historica_estoque_produtos.html')
-            fig_categorias.write_html('analise_historica_estoque_categorias.html')
-            fig_dias.write_html('analise_historica_dias_estoque.html')
-            fig_status.write_html('analise_historica_status_estoque.html')
-            
-            # Calcular variação de estoque
-            df_variacao = df.groupby('nome_produto').agg({
-                'quantidade_atual': ['first', 'last', 'mean', 'min', 'max'],
-                'dias_estoque': ['mean', 'min', 'max'],
-                'data': ['first', 'last']
+            self.figures['analise_historica_estoque_produtos'] = fig_produtos
+            self.figures['analise_historica_estoque_categorias'] = fig_categorias
+            self.figures['analise_historica_dias_estoque'] = fig_dias
+            self.figures['analise_historica_status_estoque'] = fig_status
+            
+            # Variação de estoque a partir do resumo (mesmo formato de colunas usado no main)
+            resumo = resumo.set_index('nome_produto')
+            df_variacao = pd.DataFrame({
+                ('quantidade_atual', 'first'): resumo['quantidade_inicial'],
+                ('quantidade_atual', 'last'): resumo['quantidade_final'],
+                ('quantidade_atual', 'mean'): resumo['quantidade_media'],
+                ('quantidade_atual', 'min'): resumo['quantidade_atual_min'],
+                ('quantidade_atual', 'max'): resumo['quantidade_atual_max'],
+                ('dias_estoque', 'mean'): resumo['dias_medio'],
+                ('dias_estoque', 'min'): resumo['dias_minimo'],
+                ('dias_estoque', 'max'): resumo['dias_maximo'],
+                ('data', 'first'): resumo['data_inicial'],
+                ('data', 'last'): resumo['data_final']
             })
             
             df_variacao['variacao_quantidade'] = (df_variacao[('quantidade_atual', 'last')] - 
@@ -493,31 +735,42 @@ class OLAPAnalyzer:
                                                 df_variacao[('quantidade_atual', 'first')] * 100).round(2)
             
             # Análise de status atual
-            df_status_atual = df.groupby('nome_produto').agg({
-                'status_estoque': 'last'
-            })
+            df_status_atual = resumo[['status_atual']].rename(columns={'status_atual': 'status_estoque'})
             
             return df_variacao, df_status_atual
         return None, None
 
+def _pelo_menos_um(valor):
+    numero = int(valor)
+    if numero < 1:
+        raise argparse.ArgumentTypeError("deve ser pelo menos 1")
+    return numero
+
 def main():
+    parser = argparse.ArgumentParser(description="Análises OLAP do DW_Varejo")
+    parser.add_argument('--saida', help="diretório dos arquivos HTML (padrão: OLAP_REPORT_DIR)")
+    parser.add_argument('--processos', type=_pelo_menos_um,
+                        help="processos que renderizam os gráficos (padrão: OLAP_REPORT_PROCESSES)")
+    parser.add_argument('--dashboard', action='store_true',
+                        help="gera também uma página única com todos os gráficos")
+    args = parser.parse_args()
+
     try:
         print("Gerando análises e gráficos...")
         analyzer = OLAPAnalyzer()
+        # Uma leitura de fato_vendas responde todas as análises de vendas abaixo
+        analyzer.load_sales_cube()
         
         # Análise de tendências gerais
         fig = analyzer.analyze_trends()
         if fig:
-            fig.write_html("analise_tendencias.html")
-            print("- Gerado: analise_tendencias.html")
+            analyzer.figures['analise_tendencias'] = fig
         
         # Análise de localização
         resultados_estado = analyzer.analyze_by_location()
         if resultados_estado:
-            resultados_estado['grafico_barras'].write_html("analise_localizacao_barras.html")
-            resultados_estado['grafico_pizza'].write_html("analise_localizacao_pizza.html")
-            print("- Gerado: analise_localizacao_barras.html")
-            print("- Gerado: analise_localizacao_pizza.html")
+            analyzer.figures['analise_localizacao_barras'] = resultados_estado['grafico_barras']
+            analyzer.figures['analise_localizacao_pizza'] = resultados_estado['grafico_pizza']
             
             print("\n=== Análise de Vendas por Estado ===\n")
             for estado in resultados_estado['estados']:
@@ -539,10 +792,6 @@ def main():
         # Análise histórica de preços
         resultados_preco = analyzer.analyze_price_trends()
         if resultados_preco is not None:
-            print("- Gerado: analise_historica_precos_produtos.html")
-            print("- Gerado: analise_historica_precos_categorias.html")
-            print("- Gerado: analise_historica_margem_lucro.html")
-            
             print("\n=== Análise Histórica de Preços ===\n")
             for produto in resultados_preco.index:
                 print(f"Produto: {produto}")
@@ -557,11 +806,6 @@ def main():
         # Análise histórica de estoque
         resultados_estoque, status_atual = analyzer.analyze_inventory_trends()
         if resultados_estoque is not None:
-            print("- Gerado: analise_historica_estoque_produtos.html")
-            print("- Gerado: analise_historica_estoque_categorias.html")
-            print("- Gerado: analise_historica_dias_estoque.html")
-            print("- Gerado: analise_historica_status_estoque.html")
-            
             print("\n=== Análise Histórica de Estoque ===\n")
             for produto in resultados_estoque.index:
                 print(f"Produto: {produto}")
@@ -575,6 +819,17 @@ def main():
                 print(f"Status Atual: {status_atual.loc[produto, 'status_estoque']}")
                 print(f"Período: {resultados_estoque.loc[produto, ('data', 'first')].strftime('%d/%m/%Y')} a {resultados_estoque.loc[produto, ('data', 'last')].strftime('%d/%m/%Y')}\n")
 
+        # Todos os gráficos são renderizados de uma vez, em paralelo, apontando para um único plotly.min.js
+        if analyzer.figures:
+            inicio = time.perf_counter()
+            gerados, erros = write_reports(analyzer.figures, directory=args.saida,
+                                           processes=args.processos, dashboard=args.dashboard)
+            for caminho in gerados:
+                print(f"- Gerado: {caminho}")
+            for nome, erro in erros.items():
+                print(f"- Erro ao gerar {nome}.html: {erro}")
+            print(f"Gráficos gravados em {time.perf_counter() - inicio:.2f}s")
+
     except Exception as e:
         print(f"Erro durante a análise OLAP: {str(e)}")
     finally:
@@ -1,16 +1,12 @@
-import mysql.connector
-import pymongo
+import sys
 import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pymongo
 from datetime import datetime, timedelta
 import random
-
-# MySQL connection
-mysql_config = {
-    'host': 'mysql_db',
-    'user': os.getenv('MYSQL_USER', 'user'),
-    'password': os.getenv('MYSQL_PASSWORD', 'userpassword'),
-    'database': 'VarejoBase'
-}
+from utils.mysql_pool import MySQLPool
+from models.mongodb_models import ProductComment, ProductImage
 
 # MongoDB connection
 mongo_config = {
@@ -49,7 +45,7 @@ sample_users = [
 ]
 
 def get_mysql_connection():
-    return mysql.connector.connect(**mysql_config)
+    return MySQLPool.get_connection('VarejoBase')
 
 def get_mongo_connection():
     client = pymongo.MongoClient(
@@ -132,6 +128,10 @@ def seed_mongodb():
         # Create indexes
         db.product_comments.create_index('product_code')
         db.product_images.create_index('product_code', unique=True)
+
+        # Comments and images were rewritten; drop what the API cached
+        ProductComment.invalidate_cache()
+        ProductImage.invalidate_cache()
         
         # Print summary
         print(f"MongoDB seeded successfully!")
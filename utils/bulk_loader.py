@@ -0,0 +1,106 @@
+import itertools
+import os
+import tempfile
+import time
+from config import Config
+
+class BulkLoader:
+    """Chunked bulk writes into one MySQL table.
+
+    Rows (tuples in ``columns`` order) are sent ``chunk_size`` at a time,
+    either as one multi-row ``INSERT ... VALUES (...), (...)`` or with
+    ``LOAD DATA LOCAL INFILE`` from a temporary file, and each chunk is
+    committed on its own unless ``commit=False``.
+
+    mode: 'insert', 'ignore' (INSERT IGNORE) or 'upsert'
+    (ON DUPLICATE KEY UPDATE of ``update_columns``).
+    """
+
+    def __init__(self, conn, table, columns, mode='insert', update_columns=None,
+                 chunk_size=None, method=None, commit=True):
+        if mode not in ('insert', 'ignore', 'upsert'):
+            raise ValueError(f"Invalid mode: {mode}")
+        self.conn = conn
+        self.table = table
+        self.columns = list(columns)
+        self.mode = mode
+        self.update_columns = update_columns or self.columns
+        self.chunk_size = chunk_size or Config.ETL_CHUNK_SIZE
+        self.method = method or Config.ETL_BULK_METHOD
+        self.commit = commit
+        self.rows = 0
+        self.write_seconds = 0.0
+        self.started = time.perf_counter()
+
+    def _insert_sql(self, rows=1):
+        verb = 'INSERT IGNORE' if self.mode == 'ignore' else 'INSERT'
+        placeholders = '(' + ', '.join(['%s'] * len(self.columns)) + ')'
+        sql = (f"{verb} INTO {self.table} ({', '.join(self.columns)}) "
+               f"VALUES {', '.join([placeholders] * rows)}")
+        if self.mode == 'upsert':
+            updates = ', '.join(f"{c} = VALUES({c})" for c in self.update_columns)
+            sql += f" ON DUPLICATE KEY UPDATE {updates}"
+        return sql
+
+    @staticmethod
+    def _format(value):
+        if value is None:
+            return '\\N'
+        if isinstance(value, bool):
+            return '1' if value else '0'
+        return (str(value).replace('\\', '\\\\')
+                .replace('\t', '\\t').replace('\n', '\\n'))
+
+    def _load_data(self, cursor, chunk):
+        # LOAD DATA has no ON DUPLICATE KEY UPDATE; REPLACE is the closest upsert
+        duplicates = {'insert': '', 'ignore': 'IGNORE', 'upsert': 'REPLACE'}[self.mode]
+        with tempfile.NamedTemporaryFile('w', suffix='.tsv', delete=False, encoding='utf-8') as f:
+            for row in chunk:
+                f.write('\t'.join(self._format(value) for value in row) + '\n')
+            path = f.name
+        try:
+            cursor.execute(
+                f"LOAD DATA LOCAL INFILE %s {duplicates} INTO TABLE {self.table} "
+                f"CHARACTER SET utf8mb4 FIELDS TERMINATED BY '\\t' LINES TERMINATED BY '\\n' "
+                f"({', '.join(self.columns)})",
+                (path,)
+            )
+        finally:
+            os.remove(path)
+
+    def write_chunk(self, chunk):
+        started = time.perf_counter()
+        cursor = self.conn.cursor()
+        try:
+            if self.method == 'load_data':
+                self._load_data(cursor, chunk)
+            else:
+                # The multi-row statement is built here: executemany only batches
+                # plain "INSERT INTO ... VALUES" and runs INSERT IGNORE row by row
+                cursor.execute(self._insert_sql(len(chunk)),
+                               tuple(itertools.chain.from_iterable(chunk)))
+            if self.commit:
+                self.conn.commit()
+        finally:
+            cursor.close()
+        self.rows += len(chunk)
+        self.write_seconds += time.perf_counter() - started
+
+    def load(self, rows):
+        """Write every row from an iterable; returns the number of rows sent."""
+        rows = iter(rows)
+        while True:
+            chunk = list(itertools.islice(rows, self.chunk_size))
+            if not chunk:
+                break
+            self.write_chunk(chunk)
+        return self.rows
+
+    def report(self):
+        """Print and return throughput since the loader was created (extract included)."""
+        elapsed = time.perf_counter() - self.started
+        rate = self.rows / elapsed if elapsed else 0.0
+        print(f"  {self.table}: {self.rows} linhas em {elapsed:.2f}s "
+              f"({rate:.0f} linhas/s, {self.write_seconds:.2f}s gravando)")
+        return {'table': self.table, 'rows': self.rows, 'seconds': elapsed,
+                'write_seconds': self.write_seconds, 'rows_per_second': rate}
@@ -0,0 +1,265 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from decimal import Decimal
+from config import Config
+
+try:
+    import redis
+except ImportError:  # The shared tier is optional
+    redis = None
+
+class LRUCache:
+    """Thread-safe in-process LRU with a per-entry TTL."""
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        """Return (found, value); a cached None is a valid (negative) hit."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return False, None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, value
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + (ttl or self.ttl))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def delete_prefix(self, prefix):
+        with self._lock:
+            for key in [k for k in self._entries if k.startswith(prefix)]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations
+            }
+
+def _to_json(value):
+    # Tag the types json can't round-trip, so a shared hit equals the original value
+    if isinstance(value, dict):
+        return {key: _to_json(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_to_json(item) for item in value]
+    if isinstance(value, tuple):
+        return {'__tuple__': [_to_json(item) for item in value]}
+    if isinstance(value, Decimal):
+        return {'__decimal__': str(value)}
+    if isinstance(value, datetime):
+        return {'__datetime__': value.isoformat()}
+    if isinstance(value, date):
+        return {'__date__': value.isoformat()}
+    return value
+
+def _from_json(obj):
+    if len(obj) == 1:
+        key, item = next(iter(obj.items()))
+        if key == '__tuple__':
+            return tuple(item)
+        if key == '__decimal__':
+            return Decimal(item)
+        if key == '__datetime__':
+            return datetime.fromisoformat(item)
+        if key == '__date__':
+            return date.fromisoformat(item)
+    return obj
+
+def dumps(value):
+    return json.dumps(_to_json(value), separators=(',', ':'))
+
+def loads(payload):
+    return json.loads(payload, object_hook=_from_json)
+
+class TieredCache:
+    """In-process LRU in front of an optional shared Redis-compatible tier.
+
+    The shared tier is used when CACHE_REDIS_URL is set and the redis client
+    is installed. Entries are stored as JSON (never pickle) together with
+    their TTL, so a value copied into the local tier keeps it (e.g.
+    CACHE_NEGATIVE_TTL for cached misses).
+
+    Every delete/clear also bumps a per-namespace generation in Redis; each
+    process checks it at most every CACHE_SYNC_INTERVAL seconds and drops its
+    local tier when it changed. That is how the scripts' invalidations reach
+    the API workers. Without Redis nothing crosses processes and local
+    entries are only bounded by their TTL.
+    """
+    _shared_client = None
+
+    def __init__(self, namespace):
+        self.namespace = namespace
+        self.local = LRUCache(Config.CACHE_MAX_SIZE, Config.CACHE_TTL)
+        self.shared_hits = 0
+        self.shared_misses = 0
+        self.shared_errors = 0
+        self._stats_lock = threading.Lock()
+        # Last invalidation generation seen in the shared tier (None: not read yet)
+        self._generation = None
+        self._synced_at = 0.0
+        self._sync_lock = threading.Lock()
+
+    @classmethod
+    def get_shared_client(cls):
+        if cls._shared_client is None and redis is not None and Config.CACHE_REDIS_URL:
+            cls._shared_client = redis.Redis.from_url(Config.CACHE_REDIS_URL)
+        return cls._shared_client
+
+    def _shared_key(self, key):
+        # v3: payloads are JSON [value, ttl]
+        return f"varejo:v3:{self.namespace}:{key}"
+
+    def _generation_key(self):
+        # Outside the entries' key space, so clear() doesn't delete (and reset) it
+        return f"varejo:v3-generation:{self.namespace}"
+
+    def _sync_generation(self, client):
+        """Drop the local tier if another process invalidated since the last check."""
+        now = time.monotonic()
+        with self._sync_lock:
+            if now - self._synced_at < Config.CACHE_SYNC_INTERVAL:
+                return
+            # Claimed before the round trip, so only one thread per interval makes it
+            self._synced_at = now
+            try:
+                generation = int(client.get(self._generation_key()) or 0)
+            except Exception:
+                self._count('shared_errors')
+                return
+            if self._generation is not None and generation != self._generation:
+                self.local.clear()
+            self._generation = generation
+
+    def _bump_generation(self, client):
+        try:
+            generation = client.incr(self._generation_key())
+        except Exception:
+            self._count('shared_errors')
+            return
+        with self._sync_lock:
+            # Our own local tier is already up to date
+            if self._generation is not None and generation == self._generation + 1:
+                self._generation = generation
+
+    def _count(self, counter):
+        with self._stats_lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def get(self, key):
+        client = self.get_shared_client()
+        if client is not None:
+            self._sync_generation(client)
+
+        found, value = self.local.get(key)
+        if found:
+            return True, value
+
+        if client is None:
+            return False, None
+        try:
+            payload = client.get(self._shared_key(key))
+        except Exception:
+            self._count('shared_errors')
+            return False, None
+        if payload is None:
+            self._count('shared_misses')
+            return False, None
+
+        try:
+            value, ttl = loads(payload)
+        except Exception:
+            self._count('shared_errors')
+            return False, None
+        self._count('shared_hits')
+        self.local.set(key, value, ttl)
+        return True, value
+
+    def set(self, key, value, ttl=None):
+        self.local.set(key, value, ttl)
+        client = self.get_shared_client()
+        if client is not None:
+            try:
+                client.set(self._shared_key(key), dumps([value, ttl]),
+                           ex=max(1, int(ttl or Config.CACHE_TTL)))
+            except Exception:
+                self._count('shared_errors')
+
+    def _delete_shared(self, pattern):
+        client = self.get_shared_client()
+        if client is not None:
+            try:
+                keys = list(client.scan_iter(match=pattern, count=1000))
+                if keys:
+                    client.delete(*keys)
+            except Exception:
+                self._count('shared_errors')
+            # Tell the other processes to drop their local tiers
+            self._bump_generation(client)
+
+    def delete(self, key):
+        self.local.delete(key)
+        self._delete_shared(self._shared_key(key))
+
+    def delete_prefix(self, prefix):
+        self.local.delete_prefix(prefix)
+        self._delete_shared(self._shared_key(prefix) + '*')
+
+    def clear(self):
+        self.local.clear()
+        self._delete_shared(self._shared_key('*'))
+
+    def stats(self):
+        stats = self.local.stats()
+        with self._stats_lock:
+            stats.update({
+                'shared_hits': self.shared_hits,
+                'shared_misses': self.shared_misses,
+                'shared_errors': self.shared_errors
+            })
+        stats['shared_enabled'] = self.get_shared_client() is not None
+        return stats
+
+# One cache per kind of data, keyed by codigo_produto
+product_cache = TieredCache('products')
+comment_cache = TieredCache('comments')
+image_cache = TieredCache('images')
+
+def cache_stats():
+    return {cache.namespace: cache.stats() for cache in (product_cache, comment_cache, image_cache)}
@@ -0,0 +1,112 @@
+import numpy as np
+import pandas as pd
+from mysql.connector.constants import FieldType
+from pandas.api.types import union_categoricals
+from config import Config
+
+_INTEGER_TYPES = {FieldType.TINY, FieldType.SHORT, FieldType.LONG, FieldType.LONGLONG,
+                  FieldType.INT24, FieldType.YEAR}
+_FLOAT_TYPES = {FieldType.DECIMAL, FieldType.NEWDECIMAL, FieldType.FLOAT, FieldType.DOUBLE}
+_DATE_TYPES = {FieldType.DATE, FieldType.NEWDATE, FieldType.DATETIME, FieldType.TIMESTAMP}
+
+def _column_kind(type_code):
+    if type_code in _INTEGER_TYPES:
+        return 'int'
+    if type_code in _FLOAT_TYPES:
+        return 'float'
+    if type_code in _DATE_TYPES:
+        return 'date'
+    return 'text'
+
+def _to_array(values, kind, categories):
+    if kind == 'int':
+        # NULLs only fit a float column (as NaN)
+        if None in values:
+            return np.array(values, dtype=np.float64)
+        return np.array(values, dtype=np.int64)
+    if kind == 'float':
+        return np.array(values, dtype=np.float64)
+    if kind == 'date':
+        return np.array(values, dtype='datetime64[ns]')
+    if categories:
+        return pd.Categorical(values)
+    return np.array(values, dtype=object)
+
+def _empty_array(kind, categories):
+    # Same dtypes as _to_array, so an empty result still has typed columns
+    if kind == 'int':
+        return np.empty(0, dtype=np.int64)
+    if kind == 'float':
+        return np.empty(0, dtype=np.float64)
+    if kind == 'date':
+        return np.empty(0, dtype='datetime64[ns]')
+    if categories:
+        return pd.Categorical([])
+    return np.empty(0, dtype=object)
+
+def fetch_frame(conn, query, params=(), batch_size=None, categories=True):
+    """Run a query and build a DataFrame column by column from tuple batches.
+
+    Rows come from a plain (tuple) unbuffered cursor in fetchmany batches and
+    each column is converted once per batch: DECIMAL and floats to float64,
+    integers to int64 (float64 when there are NULLs), dates to datetime64
+    and strings to pandas categoricals (object with categories=False).
+    """
+    batch_size = batch_size or Config.OLAP_FETCH_SIZE
+    batches = []
+    cursor = conn.cursor(buffered=False)
+    exhausted = False
+    try:
+        cursor.execute(query, params)
+        names = [column[0] for column in cursor.description]
+        kinds = [_column_kind(column[1]) for column in cursor.description]
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                exhausted = True
+                break
+            batches.append([_to_array(values, kind, categories)
+                            for values, kind in zip(zip(*rows), kinds)])
+    finally:
+        if not exhausted:
+            # Failed mid-fetch: drain the result so close() doesn't raise over the real error
+            conn.consume_results()
+        cursor.close()
+
+    if not batches:
+        return pd.DataFrame({name: _empty_array(kind, categories) for name, kind in zip(names, kinds)})
+
+    data = {}
+    for i, name in enumerate(names):
+        parts = [batch[i] for batch in batches]
+        if len(parts) == 1:
+            data[name] = parts[0]
+        elif isinstance(parts[0], pd.Categorical):
+            data[name] = union_categoricals(parts)
+        else:
+            data[name] = np.concatenate(parts)
+    return pd.DataFrame(data)
+
+def fetch_columns(conn, table, columns, where='', params=(), batch_size=None):
+    """Read numeric columns with fetchmany batches straight into NumPy arrays (no dict per row).
+
+    ``columns`` is a list of (name, SQL expression, dtype).
+    """
+    batch_size = batch_size or Config.OLAP_FETCH_SIZE
+    chunks = []
+    cursor = conn.cursor(buffered=False)
+    exhausted = False
+    try:
+        cursor.execute(f"SELECT {', '.join(expr for _, expr, _ in columns)} FROM {table} {where}", params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                exhausted = True
+                break
+            chunks.append(np.array(rows, dtype=np.float64))
+    finally:
+        if not exhausted:
+            conn.consume_results()
+        cursor.close()
+    data = np.concatenate(chunks) if chunks else np.empty((0, len(columns)))
+    return {name: data[:, i].astype(dtype) for i, (name, _, dtype) in enumerate(columns)}
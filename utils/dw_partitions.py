@@ -0,0 +1,121 @@
+from datetime import date
+
+# Fact tables partitioned by RANGE on id_tempo (YYYYMMDD), one partition per month
+FACT_TABLES = ('fato_vendas', 'fato_precos', 'fato_estoque')
+FUTURE_PARTITION = 'p_futuro'
+
+def month_start(day):
+    return date(day.year, day.month, 1)
+
+def next_month(day):
+    if day.month == 12:
+        return date(day.year + 1, 1, 1)
+    return date(day.year, day.month + 1, 1)
+
+def add_months(day, months):
+    """First day of the month `months` away from day's month (negative goes back)."""
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+def partition_name(day):
+    return f"p{day.year}{day.month:02d}"
+
+def partition_bound(day):
+    """Exclusive upper bound of the month's partition: id_tempo of the next month's first day."""
+    return month_id(next_month(day))
+
+def month_id(day):
+    return day.year * 10000 + day.month * 100 + 1
+
+def _bound_to_month(bound):
+    # The partition bounded by YYYYMM01 holds the month before it
+    return add_months(date(bound // 10000, bound // 100 % 100, 1), -1)
+
+def list_partitions(conn, table):
+    """Return [(name, bound)] in order; bound is None for the MAXVALUE partition.
+
+    An unpartitioned table returns an empty list.
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            SELECT PARTITION_NAME, PARTITION_DESCRIPTION
+            FROM information_schema.PARTITIONS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL
+            ORDER BY PARTITION_ORDINAL_POSITION
+        """, (table,))
+        return [(name, None if description == 'MAXVALUE' else int(description))
+                for name, description in cursor.fetchall()]
+    finally:
+        cursor.close()
+
+def ensure_partitions(conn, table, first_day, last_day, months_ahead=1):
+    """Split p_futuro so every month up to last_day (plus months_ahead) has its own partition.
+
+    Months before the first monthly partition are not created; their rows fall
+    into the oldest partition. Returns the names of the partitions created.
+    """
+    partitions = list_partitions(conn, table)
+    if not partitions:
+        return []
+
+    bounds = [bound for _, bound in partitions if bound is not None]
+    month = month_start(first_day)
+    if bounds:
+        # Continue right after the newest monthly partition
+        month = max(month, next_month(_bound_to_month(max(bounds))))
+    last_month = add_months(month_start(last_day), months_ahead)
+
+    months = []
+    while month <= last_month:
+        months.append(month)
+        month = next_month(month)
+    if not months:
+        return []
+
+    definitions = ', '.join(
+        f"PARTITION {partition_name(m)} VALUES LESS THAN ({partition_bound(m)})" for m in months)
+    cursor = conn.cursor()
+    try:
+        # p_futuro is kept empty by creating partitions ahead, so this is a metadata change
+        cursor.execute(
+            f"ALTER TABLE {table} REORGANIZE PARTITION {FUTURE_PARTITION} INTO "
+            f"({definitions}, PARTITION {FUTURE_PARTITION} VALUES LESS THAN MAXVALUE)"
+        )
+    finally:
+        cursor.close()
+    return [partition_name(m) for m in months]
+
+def truncate_month(conn, table, day):
+    """Empty one month of a fact table: TRUNCATE PARTITION when the month has its own partition."""
+    month = month_start(day)
+    bounds = [bound for _, bound in list_partitions(conn, table)]
+    # Only a partition that holds exactly this month; the oldest one also holds earlier rows
+    own_partition = (partition_bound(month) in bounds
+                     and bounds.index(partition_bound(month)) > 0
+                     and bounds[bounds.index(partition_bound(month)) - 1] == month_id(month))
+    cursor = conn.cursor()
+    try:
+        if own_partition:
+            cursor.execute(f"ALTER TABLE {table} TRUNCATE PARTITION {partition_name(month)}")
+        else:
+            cursor.execute(
+                f"DELETE FROM {table} WHERE id_tempo >= %s AND id_tempo < %s",
+                (month_id(month), partition_bound(month))
+            )
+            conn.commit()
+    finally:
+        cursor.close()
+
+def drop_partitions_before(conn, table, cutoff):
+    """Drop the monthly partitions that end on or before cutoff's month. Returns their names."""
+    limit_id = month_id(cutoff)
+    names = [name for name, bound in list_partitions(conn, table)
+             if bound is not None and bound <= limit_id]
+    if names:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(f"ALTER TABLE {table} DROP PARTITION {', '.join(names)}")
+        finally:
+            cursor.close()
+    return names
@@ -0,0 +1,81 @@
+import queue
+import threading
+from config import Config
+
+_DONE = object()
+
+def extract_batches(conn, query, params=(), batch_size=None):
+    """Yield lists of rows (dicts) read with fetchmany from an unbuffered cursor.
+
+    Only one batch is held by the generator at a time; the rest of the
+    result set stays on the server until it is asked for.
+    """
+    batch_size = batch_size or Config.ETL_FETCH_SIZE
+    cursor = conn.cursor(dictionary=True, buffered=False)
+    exhausted = False
+    try:
+        cursor.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                exhausted = True
+                break
+            yield rows
+    finally:
+        if not exhausted:
+            # Stopped early: drain the result so the connection stays usable
+            conn.consume_results()
+        cursor.close()
+
+def run_pipeline(batches, transform, loader, queue_size=None):
+    """Extract -> transform -> load with the extract running ahead in a thread.
+
+    ``batches`` (usually from extract_batches) is consumed in a background
+    thread and handed over through a bounded queue, so at most
+    ``queue_size`` batches are in memory while the caller's thread
+    transforms each row and writes it with ``loader`` (a BulkLoader).
+    Returns the number of rows loaded.
+    """
+    batches_queue = queue.Queue(maxsize=queue_size or Config.ETL_QUEUE_SIZE)
+    stop = threading.Event()
+    errors = []
+
+    def produce():
+        try:
+            for batch in batches:
+                while not stop.is_set():
+                    try:
+                        batches_queue.put(batch, timeout=0.5)
+                        break
+                    except queue.Full:
+                        continue
+                if stop.is_set():
+                    break
+        except BaseException as e:
+            errors.append(e)
+        finally:
+            if hasattr(batches, 'close'):
+                batches.close()
+            batches_queue.put(_DONE)
+
+    producer = threading.Thread(target=produce, name='etl-extract', daemon=True)
+    producer.start()
+    try:
+        while True:
+            batch = batches_queue.get()
+            if batch is _DONE:
+                break
+            loader.load(transform(row) for row in batch)
+    finally:
+        stop.set()
+        # Unblock the producer if it is waiting on a full queue
+        while producer.is_alive():
+            try:
+                batches_queue.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        producer.join()
+
+    if errors:
+        raise errors[0]
+    return loader.rows
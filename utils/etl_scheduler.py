@@ -0,0 +1,64 @@
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+class Task:
+    def __init__(self, name, func, depends_on=()):
+        self.name = name
+        self.func = func
+        self.depends_on = tuple(depends_on)
+
+def _timed(func):
+    started = time.perf_counter()
+    try:
+        return func(), None, time.perf_counter() - started
+    except Exception as e:
+        return None, str(e), time.perf_counter() - started
+
+def run_tasks(tasks, max_workers=4):
+    """Run tasks in threads, each one as soon as all of its dependencies succeeded.
+
+    A task whose dependency failed is skipped. Returns a report per task:
+    {name: {'status': 'ok' | 'erro' | 'ignorada', 'seconds', 'result', 'error'}}.
+    """
+    tasks = {task.name: task for task in tasks}
+    for task in tasks.values():
+        unknown = [dep for dep in task.depends_on if dep not in tasks]
+        if unknown:
+            raise ValueError(f"Task {task.name} depends on unknown tasks: {', '.join(unknown)}")
+
+    report = {}
+    running = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while len(report) < len(tasks):
+            progressed = False
+            for name, task in tasks.items():
+                if name in report or name in running.values():
+                    continue
+                states = [report.get(dep, {}).get('status') for dep in task.depends_on]
+                if any(state in ('erro', 'ignorada') for state in states):
+                    report[name] = {'status': 'ignorada', 'seconds': 0.0, 'result': None,
+                                    'error': 'dependência falhou'}
+                    progressed = True
+                elif all(state == 'ok' for state in states):
+                    running[executor.submit(_timed, task.func)] = name
+                    progressed = True
+
+            if not running:
+                if not progressed:
+                    raise ValueError("Circular dependency between ETL tasks")
+                continue
+            finished, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                result, error, seconds = future.result()
+                report[name] = {'status': 'erro' if error else 'ok', 'seconds': seconds,
+                                'result': result, 'error': error}
+    return report
+
+def print_report(report):
+    print("\nTarefas do ETL:")
+    for name, entry in report.items():
+        line = f"  {name}: {entry['status']} ({entry['seconds']:.2f}s)"
+        if entry['error']:
+            line += f" - {entry['error']}"
+        print(line)
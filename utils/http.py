@@ -0,0 +1,43 @@
+import hashlib
+import json
+from datetime import timezone
+from flask import Response, request
+from werkzeug.http import http_date
+
+def make_etag(*parts):
+    """Strong ETag from cheap version parts (code, updated_at, ...)."""
+    return hashlib.sha1('|'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+
+def content_etag(data):
+    """Strong ETag from the content itself, for data without a version column."""
+    payload = json.dumps(data, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+def _as_utc(value):
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.replace(microsecond=0)
+
+def cache_headers(etag, last_modified=None):
+    headers = {'ETag': f'"{etag}"', 'Cache-Control': 'no-cache'}
+    if last_modified is not None:
+        headers['Last-Modified'] = http_date(_as_utc(last_modified))
+    return headers
+
+def not_modified(etag, last_modified=None):
+    """Return a 304 response if the client's copy is current, else None.
+
+    If-None-Match wins over If-Modified-Since when both are sent.
+    """
+    if request.if_none_match:
+        fresh = request.if_none_match.contains(etag)
+    elif request.if_modified_since and last_modified is not None:
+        fresh = _as_utc(last_modified) <= _as_utc(request.if_modified_since)
+    else:
+        fresh = False
+
+    if not fresh:
+        return None
+    return Response(status=304, headers=cache_headers(etag, last_modified))
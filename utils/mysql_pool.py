@@ -0,0 +1,121 @@
+import os
+import re
+import threading
+import time
+from mysql.connector import pooling
+from mysql.connector.errors import PoolError, Error
+from config import Config
+
+class _CountingPool(pooling.MySQLConnectionPool):
+    """MySQLConnectionPool that tells its owner when a connection comes back."""
+
+    def __init__(self, on_return, **kwargs):
+        self._on_return = on_return
+        super().__init__(**kwargs)
+
+    def add_connection(self, cnx=None):
+        super().add_connection(cnx)
+        if cnx is not None:
+            self._on_return()
+
+class MySQLPool:
+    """One connection pool per MySQL database (VarejoBase, DW_Varejo).
+
+    Connections are validated on checkout and go back to the pool with the
+    usual ``conn.close()``, so callers keep the same try/finally shape they
+    had with ``mysql.connector.connect``.
+    """
+    _pools = {}
+    _stats = {}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def _setting(name, database, default):
+        # MYSQL_POOL_SIZE_DW_VAREJO overrides MYSQL_POOL_SIZE for one database
+        suffix = re.sub(r'\W', '_', database).upper()
+        return os.getenv(f'{name}_{suffix}', os.getenv(name, default))
+
+    @classmethod
+    def get_pool(cls, database):
+        with cls._lock:
+            if database not in cls._pools:
+                stats = {
+                    'size': int(cls._setting('MYSQL_POOL_SIZE', database, Config.MYSQL_POOL_SIZE)),
+                    'in_use': 0,
+                    'checkouts': 0,
+                    'checkout_failures': 0,
+                    'wait_time_total': 0.0,
+                    'wait_time_max': 0.0
+                }
+                cls._stats[database] = stats
+                cls._pools[database] = _CountingPool(
+                    on_return=lambda: cls._released(database),
+                    pool_name=f'pool_{database}',
+                    pool_size=stats['size'],
+                    pool_reset_session=True,
+                    host=Config.MYSQL_HOST,
+                    user=Config.MYSQL_USER,
+                    password=Config.MYSQL_PASSWORD,
+                    database=database,
+                    allow_local_infile=Config.MYSQL_ALLOW_LOCAL_INFILE
+                )
+            return cls._pools[database]
+
+    @classmethod
+    def _released(cls, database):
+        with cls._lock:
+            if database in cls._stats:
+                cls._stats[database]['in_use'] -= 1
+
+    @classmethod
+    def get_connection(cls, database):
+        pool = cls.get_pool(database)
+        stats = cls._stats[database]
+        timeout = float(cls._setting('MYSQL_POOL_TIMEOUT', database, Config.MYSQL_POOL_TIMEOUT))
+        started = time.monotonic()
+
+        # MySQLConnectionPool fails right away when empty, so poll until timeout.
+        # On checkout the pool pings the connection and reconnects it if needed.
+        while True:
+            try:
+                conn = pool.get_connection()
+                break
+            except PoolError:
+                if time.monotonic() - started >= timeout:
+                    with cls._lock:
+                        stats['checkout_failures'] += 1
+                    raise Exception(f"Timed out waiting for a MySQL connection to {database}")
+                time.sleep(0.01)
+            except Error:
+                with cls._lock:
+                    stats['checkout_failures'] += 1
+                raise
+
+        waited = time.monotonic() - started
+        with cls._lock:
+            stats['in_use'] += 1
+            stats['checkouts'] += 1
+            stats['wait_time_total'] += waited
+            stats['wait_time_max'] = max(stats['wait_time_max'], waited)
+        return conn
+
+    @classmethod
+    def stats(cls):
+        with cls._lock:
+            result = {}
+            for database, stats in cls._stats.items():
+                result[database] = dict(
+                    stats,
+                    idle=stats['size'] - stats['in_use'],
+                    wait_time_avg=(stats['wait_time_total'] / stats['checkouts']
+                                   if stats['checkouts'] else 0.0)
+                )
+            return result
+
+    @classmethod
+    def close_all(cls):
+        with cls._lock:
+            for pool in cls._pools.values():
+                pool._remove_connections()
+            cls._pools = {}
+            cls._stats = {}
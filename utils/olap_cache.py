@@ -0,0 +1,183 @@
+import os
+from config import Config
+from utils.dw_fetch import fetch_columns
+
+try:
+    import pyarrow as pa
+except ImportError:  # The columnar cache is optional
+    pa = None
+
+# Fact extracts cached one file per month: (column, SQL expression, dtype)
+FACT_EXTRACTS = {
+    'fato_vendas': [
+        ('id_tempo', 'id_tempo', 'int32'),
+        ('id_categoria', 'COALESCE(id_categoria, 0)', 'int32'),
+        ('id_loja', 'COALESCE(id_loja, 0)', 'int32'),
+        ('id_cliente', 'COALESCE(id_cliente, 0)', 'int32'),
+        ('quantidade', 'COALESCE(quantidade, 0)', 'int32'),
+        ('valor_total', 'valor_total', 'float64'),
+        ('desconto_total', 'desconto_total', 'float64'),
+    ],
+}
+
+# Version of each month (YYYYMM) as the DW sees it, read from the small rollups:
+# (rows, highest id_fato). A reloaded month gets new id_fato values even when
+# its row count is unchanged.
+MONTH_VERSIONS = {
+    'fato_vendas': """
+        SELECT id_tempo DIV 100, SUM(num_vendas), MAX(max_id_fato)
+        FROM agg_vendas_mes_categoria_loja
+        GROUP BY id_tempo DIV 100
+    """,
+}
+
+DIMENSION_EXTRACTS = {
+    'dim_categoria': "SELECT id_categoria, nome_categoria FROM dim_categoria",
+    'dim_loja': "SELECT id_loja, cidade, estado FROM dim_loja",
+}
+
+class OLAPCache:
+    """Local columnar copy of DW extracts for the OLAP scripts.
+
+    Each fact month is one Arrow IPC file (``<dir>/<table>/<YYYYMM>.arrow``)
+    read through a memory map. A refresh fetches from MySQL only the months
+    from the newest cached one onwards, plus older months that are missing or
+    whose version in the rollups (rows, highest id_fato, kept in the file's
+    schema metadata) no longer matches. Needs pyarrow and OLAP_CACHE_DIR.
+    """
+
+    def __init__(self, conn, directory=None):
+        self.conn = conn
+        self.directory = directory or Config.OLAP_CACHE_DIR
+
+    @staticmethod
+    def available():
+        return pa is not None and bool(Config.OLAP_CACHE_DIR)
+
+    def _month_path(self, table, ano_mes):
+        return os.path.join(self.directory, table, f"{ano_mes}.arrow")
+
+    def _dimension_path(self, table):
+        return os.path.join(self.directory, f"{table}.arrow")
+
+    @staticmethod
+    def _write(path, arrow_table):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write aside and rename, so a reader never sees half a file
+        tmp_path = path + '.tmp'
+        with pa.OSFile(tmp_path, 'wb') as sink:
+            with pa.ipc.new_file(sink, arrow_table.schema) as writer:
+                writer.write_table(arrow_table)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _read(path):
+        # The table's buffers point into the mapped file; nothing is copied here
+        return pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+
+    @classmethod
+    def _read_version(cls, path):
+        """(rows, max_id_fato) of a cached month, comparable with _dw_month_versions."""
+        arrow_table = cls._read(path)
+        max_id = (arrow_table.schema.metadata or {}).get(b'max_id_fato')
+        return arrow_table.num_rows, int(max_id) if max_id else None
+
+    def cached_months(self, table):
+        directory = os.path.join(self.directory, table)
+        if not os.path.isdir(directory):
+            return []
+        return sorted(int(name[:-len('.arrow')]) for name in os.listdir(directory)
+                      if name.endswith('.arrow'))
+
+    def _dw_month_versions(self, table):
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute(MONTH_VERSIONS[table])
+            return {int(ano_mes): (int(rows), int(max_id) if max_id is not None else None)
+                    for ano_mes, rows, max_id in cursor.fetchall()}
+        except Exception:
+            # Rollups missing: fall back to the id_tempo watermark alone
+            return {}
+        finally:
+            cursor.close()
+
+    def _dw_months_since(self, table, ano_mes):
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute(f"SELECT DISTINCT id_tempo DIV 100 FROM {table} WHERE id_tempo >= %s",
+                           (ano_mes * 100 + 1,))
+            return {int(row[0]) for row in cursor.fetchall()}
+        finally:
+            cursor.close()
+
+    def _dw_has_month(self, table, ano_mes):
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute(f"SELECT 1 FROM {table} WHERE id_tempo >= %s AND id_tempo < %s LIMIT 1",
+                           (ano_mes * 100 + 1, ano_mes * 100 + 100))
+            return cursor.fetchone() is not None
+        finally:
+            cursor.close()
+
+    def refresh(self, table):
+        """Bring the cached months of a fact table up to date; returns the months fetched."""
+        cached = self.cached_months(table)
+        # The newest cached month may have been partial: fetch it again with anything after it
+        since = cached[-1] if cached else 0
+        months = self._dw_months_since(table, since)
+
+        versions = self._dw_month_versions(table)
+        # Older months that are in the DW but not cached (e.g. a file deleted by hand)
+        months |= set(versions) - set(cached)
+        for ano_mes in cached:
+            if not versions:
+                break
+            if ano_mes not in versions:
+                if self._dw_has_month(table, ano_mes):
+                    # Rollups behind the fact (e.g. their task failed): trust the fact
+                    months.add(ano_mes)
+                else:
+                    # Month dropped from the DW (retention, or emptied by a reload)
+                    os.remove(self._month_path(table, ano_mes))
+            elif versions[ano_mes] != self._read_version(self._month_path(table, ano_mes)):
+                # Rows added or removed, or the month was reloaded with new id_fato values
+                months.add(ano_mes)
+
+        columns = FACT_EXTRACTS[table]
+        for ano_mes in sorted(months):
+            arrays = fetch_columns(self.conn, table, columns,
+                                   "WHERE id_tempo >= %s AND id_tempo < %s",
+                                   (ano_mes * 100 + 1, ano_mes * 100 + 100))
+            arrow_table = pa.table(arrays)
+            if ano_mes in versions and versions[ano_mes][1] is not None:
+                arrow_table = arrow_table.replace_schema_metadata(
+                    {'max_id_fato': str(versions[ano_mes][1])})
+            self._write(self._month_path(table, ano_mes), arrow_table)
+
+        if months or not all(os.path.exists(self._dimension_path(t)) for t in DIMENSION_EXTRACTS):
+            self.refresh_dimensions()
+        return sorted(months)
+
+    def refresh_dimensions(self):
+        cursor = self.conn.cursor()
+        try:
+            for table, query in DIMENSION_EXTRACTS.items():
+                cursor.execute(query)
+                names = [column[0] for column in cursor.description]
+                rows = cursor.fetchall()
+                arrays = {name: [row[i] for row in rows] for i, name in enumerate(names)}
+                self._write(self._dimension_path(table), pa.table(arrays))
+        finally:
+            cursor.close()
+
+    def read(self, table):
+        """All cached months of a fact table as one DataFrame."""
+        months = self.cached_months(table)
+        if not months:
+            return None
+        arrow_table = pa.concat_tables([self._read(self._month_path(table, m)) for m in months])
+        # split_blocks keeps one block per column, so numeric columns are not consolidated (copied) again
+        return arrow_table.to_pandas(split_blocks=True)
+
+    def read_dimension(self, table):
+        return self._read(self._dimension_path(table)).to_pandas()
@@ -0,0 +1,99 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+import plotly.io as pio
+from plotly.offline import get_plotlyjs
+from config import Config
+
+PLOTLYJS_FILE = 'plotly.min.js'
+DASHBOARD_FILE = 'dashboard_olap.html'
+
+_DASHBOARD_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<script src="{plotlyjs}" charset="utf-8"></script>
+<style>body {{ font-family: sans-serif; margin: 0 auto; max-width: 1400px; }} .figure {{ margin-bottom: 32px; }}</style>
+</head>
+<body>
+<h1>{title}</h1>
+{figures}
+</body>
+</html>
+"""
+
+def _render(name, fig_dict, directory, with_div):
+    """Write one chart as <name>.html next to the shared plotly.js; optionally return its dashboard div."""
+    # Figures arrive as plain dicts (already validated in the parent), so skip re-validation
+    pio.write_html(fig_dict, os.path.join(directory, f"{name}.html"),
+                   include_plotlyjs='directory', validate=False)
+    if with_div:
+        return pio.to_html(fig_dict, full_html=False, include_plotlyjs=False,
+                           validate=False, div_id=name)
+    return None
+
+def write_plotlyjs(directory):
+    """Write the plotly.js bundle every chart page references instead of embedding ~3 MB.
+
+    An existing file is replaced when it differs from the installed plotly's
+    bundle (e.g. after an upgrade), so pages never load a stale version.
+    """
+    path = os.path.join(directory, PLOTLYJS_FILE)
+    plotlyjs = get_plotlyjs()
+    if os.path.exists(path):
+        with open(path, encoding='utf-8') as bundle:
+            if bundle.read() == plotlyjs:
+                return path
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as bundle:
+        bundle.write(plotlyjs)
+    os.replace(tmp_path, path)
+    return path
+
+def write_reports(figures, directory=None, processes=None, dashboard=False,
+                  title='Análises OLAP - DW Varejo'):
+    """Render {name: figure} to HTML files, in a process pool when there is more than one figure.
+
+    Every page loads the shared plotly.min.js from ``directory``. With
+    ``dashboard`` all figures are also stacked in a single page
+    (DASHBOARD_FILE). Returns ``(written, errors)``: the paths written and
+    {name: message} for the figures that failed.
+    """
+    directory = directory or Config.OLAP_REPORT_DIR
+    if processes is None:
+        processes = Config.OLAP_REPORT_PROCESSES
+    if processes < 1:
+        raise ValueError("processes must be at least 1")
+    os.makedirs(directory, exist_ok=True)
+    # Written up front so the workers never race to create it
+    write_plotlyjs(directory)
+
+    jobs = [(name, fig.to_plotly_json(), directory, dashboard) for name, fig in figures.items()]
+    outputs, errors = {}, {}
+    if processes > 1 and len(jobs) > 1:
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=min(len(jobs), processes), mp_context=context) as executor:
+            futures = {executor.submit(_render, *job): job[0] for job in jobs}
+            for future, name in futures.items():
+                try:
+                    outputs[name] = future.result()
+                except Exception as e:
+                    errors[name] = str(e)
+    else:
+        for job in jobs:
+            try:
+                outputs[job[0]] = _render(*job)
+            except Exception as e:
+                errors[job[0]] = str(e)
+
+    # Keep the order the figures were added in
+    written = [os.path.join(directory, f"{name}.html") for name in figures if name in outputs]
+    if dashboard and outputs:
+        path = os.path.join(directory, DASHBOARD_FILE)
+        divs = '\n'.join(f'<div class="figure">{outputs[name]}</div>'
+                         for name in figures if name in outputs)
+        with open(path, 'w', encoding='utf-8') as page:
+            page.write(_DASHBOARD_TEMPLATE.format(title=title, plotlyjs=PLOTLYJS_FILE, figures=divs))
+        written.append(path)
+    return written, errors
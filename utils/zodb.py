@@ -0,0 +1,159 @@
+import os
+import threading
+from contextlib import contextmanager
+from ZODB import DB
+from ZODB.FileStorage import FileStorage
+from ZODB.POSException import ReadOnlyError
+from config import Config
+
+class ZODBConnection:
+    """Process-wide ZODB database shared by every request.
+
+    The storage is opened read-only so the API never holds the FileStorage
+    lock (scripts/migrate_products.py still needs it to write). When the file
+    changes on disk the DB is reopened and the old one is closed as soon as
+    its last connection goes back to the pool.
+    """
+    _db = None
+    _signature = None
+    _open_connections = {}
+    _retired = []
+    _reopen_listeners = []
+    _slots = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def open(cls):
+        with cls._lock:
+            if cls._slots is None:
+                cls._slots = threading.BoundedSemaphore(Config.ZODB_POOL_SIZE)
+            if cls._db is None:
+                cls._open_db()
+        return cls._db
+
+    @classmethod
+    def _open_db(cls):
+        path = Config.ZODB_PATH
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if not os.path.exists(path):
+            cls._init_root(path)
+
+        try:
+            cls._db = cls._read_only_db(path)
+        except ReadOnlyError:
+            # The file exists but has no root object yet (e.g. created empty)
+            cls._init_root(path)
+            cls._db = cls._read_only_db(path)
+        cls._signature = cls._file_signature()
+        cls._open_connections[id(cls._db)] = 0
+
+    @staticmethod
+    def _init_root(path):
+        # A read-only storage can neither create the file nor the root object
+        # DB() needs, so both are written once through a writable storage
+        DB(FileStorage(path)).close()
+
+    @staticmethod
+    def _read_only_db(path):
+        storage = FileStorage(path, read_only=True)
+        try:
+            return DB(
+                storage,
+                pool_size=Config.ZODB_POOL_SIZE,
+                cache_size=Config.ZODB_CACHE_SIZE
+            )
+        except Exception:
+            storage.close()
+            raise
+
+    @staticmethod
+    def _file_signature():
+        stat = os.stat(Config.ZODB_PATH)
+        return stat.st_mtime_ns, stat.st_size
+
+    @classmethod
+    def _checkout_db(cls):
+        reopened = False
+        with cls._lock:
+            if cls._db is None:
+                cls._open_db()
+            elif cls._file_signature() != cls._signature:
+                cls._retired.append(cls._db)
+                cls._open_db()
+                cls._close_idle_retired()
+                reopened = True
+            db = cls._db
+            cls._open_connections[id(db)] += 1
+
+        if reopened:
+            for listener in cls._reopen_listeners:
+                listener()
+        return db
+
+    @classmethod
+    def add_reopen_listener(cls, listener):
+        """Call listener() whenever the storage file changed and the DB was reopened."""
+        cls._reopen_listeners.append(listener)
+
+    @classmethod
+    def _checkin_db(cls, db):
+        with cls._lock:
+            if id(db) in cls._open_connections:
+                cls._open_connections[id(db)] -= 1
+            cls._close_idle_retired()
+
+    @classmethod
+    def _close_idle_retired(cls):
+        for db in list(cls._retired):
+            if cls._open_connections[id(db)] == 0:
+                cls._retired.remove(db)
+                del cls._open_connections[id(db)]
+                db.close()
+
+    @classmethod
+    @contextmanager
+    def connection(cls):
+        if cls._slots is None:
+            cls.open()
+        if not cls._slots.acquire(timeout=Config.ZODB_POOL_TIMEOUT):
+            raise Exception("Timed out waiting for a ZODB connection")
+        try:
+            db = cls._checkout_db()
+            try:
+                connection = db.open()
+                try:
+                    yield connection
+                finally:
+                    # Returns the connection (and its object cache) to the pool
+                    connection.close()
+            finally:
+                cls._checkin_db(db)
+        finally:
+            cls._slots.release()
+
+    @classmethod
+    def stats(cls):
+        with cls._lock:
+            if cls._db is None:
+                return {'open': False}
+            return {
+                'open': True,
+                'pool_size': cls._db.getPoolSize(),
+                'cache_size': cls._db.getCacheSize(),
+                'cached_objects': cls._db.cacheSize(),
+                'connections_in_use': cls._open_connections[id(cls._db)]
+            }
+
+    @classmethod
+    def close(cls):
+        with cls._lock:
+            for db in cls._retired:
+                db.close()
+            cls._retired = []
+            if cls._db is not None:
+                cls._db.close()
+                cls._db = None
+            cls._open_connections = {}
+            cls._signature = None
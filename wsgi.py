@@ -0,0 +1,5 @@
+# Production entry point: gunicorn -c gunicorn.conf.py wsgi:app
+from config import ProductionConfig
+from main import create_app
+
+app = create_app(ProductionConfig)